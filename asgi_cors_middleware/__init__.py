@@ -1 +1,3 @@
+from .metrics import CorsMetrics
 from .middleware import CorsASGIApp
+from .policy import CorsPolicy
@@ -0,0 +1,83 @@
+"""
+Bounded caches used by CorsASGIApp.
+"""
+
+import collections
+import typing
+
+EVICTION_POLICIES = ("lru", "fifo")
+
+
+class LRUCache:
+    """
+    Bounded mapping that evicts the least recently used entry once
+    ``maxsize`` is reached. With ``eviction="fifo"`` hits don't refresh an
+    entry, so the oldest inserted entry is evicted first.
+
+    Hit, miss and eviction counters are kept so the cache can be sized.
+    """
+
+    def __init__(self, maxsize: int = 1024, eviction: str = "lru") -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be a positive integer")
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(
+                "eviction must be one of {}".format(
+                    ", ".join(EVICTION_POLICIES)
+                )
+            )
+        self.maxsize = maxsize
+        self.eviction = eviction
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = collections.OrderedDict()
+        self._refresh = eviction == "lru"
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        if self._refresh:
+            self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value) -> None:
+        data = self._data
+        if key in data:
+            data[key] = value
+            if self._refresh:
+                data.move_to_end(key)
+            return
+        if len(data) >= self.maxsize:
+            data.popitem(last=False)
+            self.evictions += 1
+        data[key] = value
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def items(self):
+        """
+        Entries from the least to the most recently used, without touching
+        their order or the counters.
+        """
+        return list(self._data.items())
+
+    def info(self) -> typing.Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
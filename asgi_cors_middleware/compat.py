@@ -0,0 +1,53 @@
+"""
+ASGI 2 compatibility without importing asyncio, inspect or asgiref, which
+dominate the package's import time otherwise.
+"""
+
+import functools
+
+CO_COROUTINE = 0x80
+
+
+def iscoroutinefunction(func) -> bool:
+    while isinstance(func, functools.partial):
+        func = func.func
+    if getattr(func, "_is_coroutine", None) is not None:
+        # marked with asyncio.coroutines._is_coroutine or asgiref's
+        #  markcoroutinefunction.
+        return True
+    func = getattr(func, "__func__", func)
+    code = getattr(func, "__code__", None)
+    return code is not None and bool(code.co_flags & CO_COROUTINE)
+
+
+def is_double_callable(application) -> bool:
+    """
+    Tests whether an application is a legacy ASGI 2 (double-callable) one,
+    following the same rules as ``asgiref.compatibility``.
+    """
+    if getattr(application, "_asgi_single_callable", False):
+        return False
+    if getattr(application, "_asgi_double_callable", False):
+        return True
+    # classes are double-callable
+    if isinstance(application, type):
+        return True
+    # instances depend on their __call__
+    if hasattr(application, "__call__"):
+        if iscoroutinefunction(application.__call__):
+            return False
+    return not iscoroutinefunction(application)
+
+
+def guarantee_single_callable(application):
+    """
+    Returns ``application`` as an ASGI 3 (single-callable) application.
+    """
+    if not is_double_callable(application):
+        return application
+
+    async def new_application(scope, receive, send):
+        instance = application(scope)
+        return await instance(receive, send)
+
+    return new_application
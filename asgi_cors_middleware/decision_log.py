@@ -0,0 +1,174 @@
+"""
+Sampled, structured log of CORS decisions written by a background thread.
+"""
+
+import atexit
+import collections
+import json
+import os
+import random
+import threading
+import time
+import typing
+
+RECORD_FIELDS = (
+    "time", "kind", "path", "origin", "requested_method",
+    "requested_headers", "allowed", "reasons",
+)
+
+
+class DecisionLog:
+    """
+    Records a sample of the middleware's decisions as JSON lines in
+    ``path``, e.g.::
+
+        {"time": 1700000000.0, "kind": "preflight", "path": "/api",
+         "origin": "https://e.com", "requested_method": "PUT",
+         "requested_headers": "x-token", "allowed": false,
+         "reasons": ["method"]}
+
+    ``sample_rate`` is the fraction of decisions recorded; denied ones only
+    unless ``include_allowed`` is set. Requests never wait on the file: a
+    record is appended to a queue of at most ``queue_size`` records and a
+    daemon thread writes them out in batches of up to ``batch_size``, every
+    ``flush_interval`` seconds or as soon as a batch is full. When the
+    queue is full, records are dropped and counted in ``dropped``. A batch
+    that can't be written is dropped too, counted in ``dropped`` and
+    ``write_errors``, and the thread carries on with the next one.
+
+    Pass an instance as ``CorsASGIApp(decision_log=...)``. ``close()``
+    writes out what is queued and stops the thread; it also runs at exit.
+    The thread doesn't survive a fork: a process forked from the one that
+    built the log (e.g. a pre-fork server's worker) starts its own writer,
+    with an empty queue, on its first record.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 0.01,
+        include_allowed: bool = False,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        random: typing.Callable[[], float] = random.random,
+        clock: typing.Callable[[], float] = time.time,
+    ) -> None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if queue_size <= 0 or batch_size <= 0:
+            raise ValueError("queue_size and batch_size must be positive")
+        self.path = path
+        self.sample_rate = sample_rate
+        self.include_allowed = include_allowed
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.random = random
+        self.clock = clock
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        self.closed = False
+        self.start()
+        atexit.register(self.close)
+
+    def start(self) -> None:
+        """
+        Starts the writer thread of the current process. Records queued by
+        the parent of a forked process are left to the parent.
+        """
+        self.pid = os.getpid()
+        self.queue = collections.deque()
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name="cors-decision-log", daemon=True
+        )
+        self.thread.start()
+
+    def record(
+        self,
+        kind: str,
+        scope,
+        origin: bytes,
+        allowed: bool,
+        reasons: typing.Sequence[str] = (),
+        requested_method: typing.Optional[bytes] = None,
+        requested_headers: typing.Optional[bytes] = None,
+    ) -> None:
+        """
+        Queues a decision if it is sampled. Never blocks; only a tuple is
+        built here, the record is encoded by the writer thread.
+        """
+        if allowed and not self.include_allowed:
+            return
+        if self.random() >= self.sample_rate:
+            return
+        if self.pid != os.getpid() and not self.closed:
+            self.start()
+        queue = self.queue
+        if len(queue) >= self.queue_size or self.closed:
+            self.dropped += 1
+            return
+        queue.append((
+            self.clock(), kind, scope.get("path"), origin, requested_method,
+            requested_headers, allowed, tuple(reasons),
+        ))
+        if len(queue) >= self.batch_size:
+            self.wakeup.set()
+
+    def run(self) -> None:
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes out the queued records, ``batch_size`` at a time.
+        """
+        queue = self.queue
+        while queue:
+            lines = []
+            while queue and len(lines) < self.batch_size:
+                lines.append(encode_record(queue.popleft()))
+            try:
+                with open(self.path, "a") as f:
+                    f.write("".join(lines))
+            except OSError:
+                self.write_errors += 1
+                self.dropped += len(lines)
+                if self.write_errors == 1:
+                    import logging
+
+                    logging.getLogger(__name__).exception(
+                        "Failed to write CORS decisions to %s", self.path
+                    )
+                continue
+            self.written += len(lines)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self.pid != os.getpid():
+            # forked without recording anything: the queue is the parent's.
+            self.queue.clear()
+        self.wakeup.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+
+def _decode(value: typing.Optional[bytes]) -> typing.Optional[str]:
+    return None if value is None else value.decode("latin-1")
+
+
+def encode_record(record: tuple) -> str:
+    (timestamp, kind, path, origin, requested_method, requested_headers,
+     allowed, reasons) = record
+    return json.dumps(dict(zip(RECORD_FIELDS, (
+        timestamp, kind, path, _decode(origin), _decode(requested_method),
+        _decode(requested_headers), allowed, list(reasons),
+    )))) + "\n"
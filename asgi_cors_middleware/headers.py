@@ -0,0 +1,118 @@
+"""
+Raw ASGI header helpers used on the request hot path.
+"""
+
+import typing
+
+ORIGIN = b"origin"
+COOKIE = b"cookie"
+REQUEST_METHOD = b"access-control-request-method"
+REQUEST_HEADERS = b"access-control-request-headers"
+VARY = b"vary"
+CORS_HEADER_PREFIX = b"access-control-"
+# bounds applied to Access-Control-Request-Headers before it is parsed.
+MAX_REQUEST_HEADERS = 64
+MAX_REQUEST_HEADERS_LENGTH = 2048
+
+
+def scan_request_headers(
+        raw_headers: typing.Iterable[typing.Tuple[bytes, bytes]]
+) -> typing.Tuple[
+    typing.Optional[bytes], bool, typing.Optional[bytes],
+    typing.Optional[bytes]
+]:
+    """
+    Walks the raw request headers once and returns
+    ``(origin, has_cookie, request_method, request_headers)``.
+
+    Values are returned undecoded; repeated headers keep their first value.
+    """
+    origin = request_method = request_headers = None
+    has_cookie = False
+    for key, value in raw_headers:
+        if key == ORIGIN:
+            if origin is None:
+                origin = value
+        elif key == COOKIE:
+            has_cookie = True
+        elif key == REQUEST_METHOD:
+            if request_method is None:
+                request_method = value
+        elif key == REQUEST_HEADERS:
+            if request_headers is None:
+                request_headers = value
+    return origin, has_cookie, request_method, request_headers
+
+
+def validate_request_headers(
+        value: bytes,
+        allowed: typing.Optional[typing.AbstractSet[bytes]],
+        max_count: int = MAX_REQUEST_HEADERS,
+        max_length: int = MAX_REQUEST_HEADERS_LENGTH,
+) -> bool:
+    """
+    Checks a raw Access-Control-Request-Headers value against ``allowed``, a
+    set of lowercased header names (None allows any name).
+
+    The value is walked once, one comma-separated name at a time, and the
+    walk stops at the first name that isn't allowed. Values longer than
+    ``max_length`` bytes or listing more than ``max_count`` names are
+    refused without looking at the names.
+    """
+    length = len(value)
+    if length > max_length:
+        return False
+    count = 0
+    start = 0
+    while start <= length:
+        end = value.find(b",", start)
+        if end == -1:
+            end = length
+        name = value[start:end].strip()
+        start = end + 1
+        if not name:
+            continue
+        count += 1
+        if count > max_count:
+            return False
+        if allowed is not None and name.lower() not in allowed:
+            return False
+    return True
+
+
+def _lists_token(value: bytes, token: bytes) -> bool:
+    return any(
+        item.strip().lower() == token for item in value.split(b",")
+    )
+
+
+def rewrite_response_headers(
+        raw_headers: typing.Iterable[typing.Tuple[bytes, bytes]],
+        cors_headers: typing.Sequence[typing.Tuple[bytes, bytes]],
+        vary: bool,
+) -> typing.List[typing.Tuple[bytes, bytes]]:
+    """
+    Returns a copy of an app's raw response headers with ``cors_headers``
+    added, made in a single pass over the app's headers.
+
+    Headers the app set under one of the names in ``cors_headers`` are
+    replaced. With ``vary``, ``Origin`` is merged into the first ``vary``
+    header, or appended as a new one if there is none.
+    """
+    names = [key for key, _ in cors_headers]
+    rewritten = []
+    append = rewritten.append
+    for header in raw_headers:
+        key = header[0]
+        if key.startswith(CORS_HEADER_PREFIX) and key in names:
+            continue
+        if vary and key == VARY:
+            vary = False
+            value = header[1]
+            if value.strip() != b"*" and not _lists_token(value, b"origin"):
+                header = (key, value + b", Origin")
+        append(header)
+    rewritten.extend(cors_headers)
+    if vary:
+        append((VARY, b"Origin"))
+    return rewritten
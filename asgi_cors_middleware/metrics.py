@@ -0,0 +1,191 @@
+"""
+Optional instrumentation for CorsASGIApp with Prometheus text exposition.
+"""
+
+import time
+import typing
+
+from .cache import LRUCache
+
+OUTCOMES = (
+    "passthrough",
+    "simple_allowed",
+    "simple_denied",
+    "simple_rejected",
+    "preflight_204",
+    "preflight_403",
+    "preflight_throttled",
+)
+FAILURE_REASONS = ("origin", "method", "headers")
+DEFAULT_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001,
+    0.00025, 0.0005, 0.001, 0.0025, 0.005,
+)
+
+
+def _format_float(value: float) -> str:
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n"
+    )
+
+
+class CorsMetrics:
+    """
+    Counters by outcome and a histogram of the time spent in the middleware
+    itself, excluding the wrapped app.
+
+    Pass an instance as ``CorsASGIApp(metrics=...)``; the same instance may
+    be shared by several middlewares. ``render_prometheus()`` returns the
+    Prometheus text exposition format.
+
+    With ``track_origins`` set, preflight and simple requests are also
+    counted for up to that many origins (the least recently seen ones are
+    dropped), and ``preflight_ratios()`` shows which origins would gain the
+    most from a longer ``Access-Control-Max-Age``.
+    """
+
+    def __init__(
+        self,
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+        prefix: str = "cors",
+        clock: typing.Callable[[], float] = time.perf_counter,
+        track_origins: int = 0,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self.clock = clock
+        self.requests = dict.fromkeys(OUTCOMES, 0)
+        self.preflight_failures = dict.fromkeys(FAILURE_REASONS, 0)
+        self.regex_evaluations = 0
+        self.bucket_counts = {
+            outcome: [0] * len(self.buckets) for outcome in OUTCOMES
+        }
+        self.durations = dict.fromkeys(OUTCOMES, 0.0)
+        # origin -> [preflights, simple requests]
+        self.origins = None
+        if track_origins:
+            self.origins = LRUCache(maxsize=track_origins)
+
+    def observe_origin(self, origin: bytes, preflight: bool) -> None:
+        counts = self.origins.get(origin)
+        if counts is None:
+            counts = [0, 0]
+            self.origins.set(origin, counts)
+        counts[0 if preflight else 1] += 1
+
+    def preflight_ratios(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        Returns the tracked origins with their preflight and simple request
+        counts and the ratio between them (None without simple requests),
+        most preflights first.
+        """
+        if self.origins is None:
+            return []
+        ratios = [
+            {
+                "origin": origin.decode("latin-1"),
+                "preflights": preflights,
+                "simple": simple,
+                "ratio": preflights / simple if simple else None,
+            }
+            for origin, (preflights, simple) in self.origins.items()
+        ]
+        ratios.sort(key=lambda entry: entry["preflights"], reverse=True)
+        return ratios
+
+    def observe(
+            self,
+            outcome: str,
+            seconds: float,
+            failures: typing.Iterable[str] = (),
+    ) -> None:
+        """
+        Records a request's outcome and the time spent in the middleware,
+        along with the reasons a preflight was refused.
+        """
+        for reason in failures:
+            self.preflight_failures[reason] += 1
+        self.requests[outcome] += 1
+        self.durations[outcome] += seconds
+        counts = self.bucket_counts[outcome]
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                counts[index] += 1
+                break
+
+    def render_prometheus(self) -> str:
+        prefix = self.prefix
+        lines = [
+            "# HELP {}_requests_total Requests handled by the CORS "
+            "middleware by outcome.".format(prefix),
+            "# TYPE {}_requests_total counter".format(prefix),
+        ]
+        for outcome, count in self.requests.items():
+            lines.append('{}_requests_total{{outcome="{}"}} {}'.format(
+                prefix, outcome, count
+            ))
+
+        lines += [
+            "# HELP {}_preflight_failures_total Rejected preflights by "
+            "failure reason.".format(prefix),
+            "# TYPE {}_preflight_failures_total counter".format(prefix),
+        ]
+        for reason, count in self.preflight_failures.items():
+            lines.append(
+                '{}_preflight_failures_total{{reason="{}"}} {}'.format(
+                    prefix, reason, count
+                )
+            )
+
+        lines += [
+            "# HELP {}_origin_regex_evaluations_total Origins checked "
+            "against allow_origin_regex.".format(prefix),
+            "# TYPE {}_origin_regex_evaluations_total counter".format(prefix),
+            "{}_origin_regex_evaluations_total {}".format(
+                prefix, self.regex_evaluations
+            ),
+        ]
+
+        if self.origins is not None:
+            lines += [
+                "# HELP {}_origin_requests_total Preflight and simple "
+                "requests by origin.".format(prefix),
+                "# TYPE {}_origin_requests_total counter".format(prefix),
+            ]
+            for entry in self.preflight_ratios():
+                for kind in ("preflights", "simple"):
+                    lines.append(
+                        '{}_origin_requests_total{{origin="{}",kind="{}"}} '
+                        '{}'.format(
+                            prefix, _escape_label(entry["origin"]), kind,
+                            entry[kind],
+                        )
+                    )
+
+        name = "{}_middleware_seconds".format(prefix)
+        lines += [
+            "# HELP {} Time spent in the CORS middleware, excluding the "
+            "wrapped app.".format(name),
+            "# TYPE {} histogram".format(name),
+        ]
+        for outcome in OUTCOMES:
+            cumulative = 0
+            for bound, count in zip(self.buckets, self.bucket_counts[outcome]):
+                cumulative += count
+                lines.append('{}_bucket{{outcome="{}",le="{}"}} {}'.format(
+                    name, outcome, _format_float(bound), cumulative
+                ))
+            lines.append('{}_bucket{{outcome="{}",le="+Inf"}} {}'.format(
+                name, outcome, self.requests[outcome]
+            ))
+            lines.append('{}_sum{{outcome="{}"}} {}'.format(
+                name, outcome, _format_float(self.durations[outcome])
+            ))
+            lines.append('{}_count{{outcome="{}"}} {}'.format(
+                name, outcome, self.requests[outcome]
+            ))
+        return "\n".join(lines) + "\n"
@@ -3,22 +3,85 @@ Adds the following features to an ASGI app:
     * CORS middleware
 """
 
-import functools
-import re
 import typing
 
-from asgiref.compatibility import guarantee_single_callable
-from starlette.datastructures import Headers, MutableHeaders
+from .cache import LRUCache
+from .compat import guarantee_single_callable
+from .headers import (
+    MAX_REQUEST_HEADERS, MAX_REQUEST_HEADERS_LENGTH,
+    rewrite_response_headers, scan_request_headers, validate_request_headers,
+)
+from .metrics import CorsMetrics
+from .provider import CachedOriginProvider, OriginProvider
+from .profiling import AllocationProfiler
+from .policy import (
+    ALLOW_ORIGIN_HEADER, CorsPolicy, PolicyFileWatcher,
+)
+from .routing import PolicyRouter
+from .throttle import PreflightThrottle
 
-from starlette.responses import PlainTextResponse
-from starlette.responses import Response
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from .decision_log import DecisionLog
 
-# OPTIONS doesn't make sense to return as an allowed method for CORS.
-# See https://stackoverflow.com/a/68529748
-ALL_METHODS = ("DELETE", "GET", "PATCH", "POST", "PUT")
-SAFELISTED_HEADERS = {
-    "Accept", "Accept-Language", "Content-Language", "Content-Type"
-}
+ALLOW_HEADERS_HEADER = b"access-control-allow-headers"
+FAILURE_CONTENT_TYPE = (b"content-type", b"text/plain; charset=utf-8")
+VARY_ORIGIN = (b"vary", b"Origin")
+WS_POLICY_VIOLATION = 1008
+ORIGIN_FAILURE = ("origin",)
+PREFLIGHT_FAILURE_PREFIX = b"Disallowed CORS "
+SAFE_METHODS = frozenset(("GET", "HEAD"))
+REJECTED_SIMPLE_BODY = b"Disallowed CORS origin"
+REJECTED_SIMPLE_HEADERS = (
+    FAILURE_CONTENT_TYPE,
+    (b"content-length", str(len(REJECTED_SIMPLE_BODY)).encode()),
+)
+
+
+class SimpleResponseSend:
+    """
+    ``send`` callable handed to the app for cross-origin simple requests.
+    Rewrites the response start message's headers in one pass, adding the
+    pre-encoded CORS headers (replacing any the app set itself) and merging
+    ``Origin`` into ``Vary``.
+    """
+
+    __slots__ = ("send", "headers", "vary")
+
+    def __init__(self, send, headers, vary: bool) -> None:
+        self.send = send
+        self.headers = headers
+        self.vary = vary
+
+    async def __call__(self, message) -> None:
+        if message["type"] == "http.response.start":
+            self.rewrite(message)
+        await self.send(message)
+
+    def rewrite(self, message) -> None:
+        message["headers"] = rewrite_response_headers(
+            message.get("headers", ()), self.headers, self.vary
+        )
+
+
+class TimedSimpleResponseSend(SimpleResponseSend):
+    """
+    SimpleResponseSend that accumulates the time spent rewriting headers,
+    used when metrics are enabled.
+    """
+
+    __slots__ = ("clock", "elapsed")
+
+    def __init__(self, send, headers, vary: bool, clock) -> None:
+        super().__init__(send, headers, vary)
+        self.clock = clock
+        self.elapsed = 0.0
+
+    async def __call__(self, message) -> None:
+        if message["type"] == "http.response.start":
+            started = self.clock()
+            self.rewrite(message)
+            self.elapsed += self.clock() - started
+        await self.send(message)
 
 
 class CorsASGIApp:
@@ -29,158 +92,523 @@ class CorsASGIApp:
         allow_methods: typing.Sequence[str] = ("GET",),
         allow_headers: typing.Sequence[str] = (),
         allow_credentials: bool = False,
-        allow_origin_regex: str = None,
+        allow_origin_regex: typing.Union[str, typing.Sequence[str]] = None,
         expose_headers: typing.Sequence[str] = (),
         max_age: int = 600,
+        max_age_by_origin: typing.Optional[typing.Mapping[str, int]] = None,
+        legacy_origin_matching: bool = False,
+        max_request_headers: int = MAX_REQUEST_HEADERS,
+        max_request_headers_length: int = MAX_REQUEST_HEADERS_LENGTH,
+        decision_cache_size: int = 0,
+        decision_cache_eviction: str = "lru",
+        preflight_cache_size: int = 0,
+        request_headers_cache_size: int = 256,
+        metrics: typing.Optional[CorsMetrics] = None,
+        policy: typing.Optional[CorsPolicy] = None,
+        policy_file: typing.Optional[str] = None,
+        policy_reload_interval: float = 1.0,
+        routes: typing.Optional[
+            typing.Mapping[str, typing.Optional[CorsPolicy]]
+        ] = None,
+        enforce_websocket_origin: bool = False,
+        reject_disallowed_simple: bool = False,
+        reject_unsafe_methods_only: bool = False,
+        reject_paths: typing.Sequence[str] = (),
+        origin_provider: typing.Optional[OriginProvider] = None,
+        allocation_profiler: typing.Optional[AllocationProfiler] = None,
+        decision_log: typing.Optional["DecisionLog"] = None,
+        preflight_throttle: typing.Optional[PreflightThrottle] = None,
     ) -> None:
 
-        if "*" in allow_methods:
-            allow_methods = ALL_METHODS
-
-        compiled_allow_origin_regex = None
-        if allow_origin_regex is not None:
-            compiled_allow_origin_regex = re.compile(allow_origin_regex)
-
-        simple_headers = {}
-        if "*" in origins:
-            simple_headers["Access-Control-Allow-Origin"] = "*"
-        if allow_credentials:
-            simple_headers["Access-Control-Allow-Credentials"] = "true"
-        if expose_headers:
-            simple_headers["Access-Control-Expose-Headers"] = \
-                ", ".join(expose_headers)
-
-        preflight_headers = {}
-        if "*" in origins:
-            preflight_headers["Access-Control-Allow-Origin"] = "*"
-        elif len(origins) > 1 or compiled_allow_origin_regex is not None:
-            preflight_headers["Vary"] = "Origin"
-        preflight_headers.update(
-            {
-                "Access-Control-Allow-Methods": ", ".join(allow_methods),
-                "Access-Control-Max-Age": str(max_age),
-            }
-        )
-        # re-including normally safelisted headers implies that you want to lift the browsers
-        #  additional restrictions on those headers. we don't want to do that by default.
-        # See https://developer.mozilla.org/en-US/docs/Glossary/CORS-safelisted_request_header#additional_restrictions
-        allow_headers = sorted(set(allow_headers))
-        if allow_headers and "*" not in allow_headers:
-            preflight_headers["Access-Control-Allow-Headers"] = \
-                ", ".join(allow_headers)
-        if allow_credentials:
-            preflight_headers["Access-Control-Allow-Credentials"] = "true"
+        if policy_file is not None:
+            policy = CorsPolicy.from_file(policy_file)
+        elif policy is None:
+            policy = CorsPolicy(
+                origins=origins,
+                allow_methods=allow_methods,
+                allow_headers=allow_headers,
+                allow_credentials=allow_credentials,
+                allow_origin_regex=allow_origin_regex,
+                expose_headers=expose_headers,
+                max_age=max_age,
+                max_age_by_origin=max_age_by_origin,
+                legacy_origin_matching=legacy_origin_matching,
+                max_request_headers=max_request_headers,
+                max_request_headers_length=max_request_headers_length,
+            )
 
         self.app = guarantee_single_callable(app)
-        self.origins = origins
-        self.allow_methods = allow_methods
-        self.allow_headers = [h.lower() for h in allow_headers]
-        self.allow_all_origins = "*" in origins
-        self.allow_all_headers = "*" in allow_headers
-        self.allow_origin_regex = compiled_allow_origin_regex
-        self.simple_headers = simple_headers
-        self.preflight_headers = preflight_headers
+        self.policy = policy
+        self.router = None
+        if routes:
+            self.router = PolicyRouter(routes)
+        self.decision_cache = None
+        if decision_cache_size:
+            self.decision_cache = LRUCache(
+                maxsize=decision_cache_size, eviction=decision_cache_eviction
+            )
+        self.preflight_cache = None
+        if preflight_cache_size:
+            self.preflight_cache = LRUCache(maxsize=preflight_cache_size)
+        self.request_headers_cache = None
+        if request_headers_cache_size:
+            self.request_headers_cache = LRUCache(
+                maxsize=request_headers_cache_size
+            )
+        self.metrics = metrics
+        if origin_provider is not None and \
+                not isinstance(origin_provider, CachedOriginProvider):
+            origin_provider = CachedOriginProvider(origin_provider)
+        self.origin_provider = origin_provider
+        self.enforce_websocket_origin = enforce_websocket_origin
+        self.reject_disallowed_simple = reject_disallowed_simple
+        self.reject_unsafe_methods_only = reject_unsafe_methods_only
+        self.reject_paths = tuple(path.rstrip("/") for path in reject_paths)
+        self.allocation_profiler = allocation_profiler
+        self.decision_log = decision_log
+        self.preflight_throttle = preflight_throttle
+        self.policy_watcher = None
+        if policy_file is not None:
+            self.policy_watcher = PolicyFileWatcher(
+                self, policy_file, interval=policy_reload_interval
+            )
 
     async def __call__(
             self, scope, receive, send
     ) -> None:
         if scope["type"] != "http":
+            if scope["type"] == "websocket" and self.enforce_websocket_origin:
+                return await self.websocket_handshake(scope, receive, send)
+            if scope["type"] == "lifespan" and \
+                    self.policy_watcher is not None:
+                self.policy_watcher.start()
             return await self.app(scope, receive, send)
+        if self.allocation_profiler is not None and \
+                not self.allocation_profiler.active:
+            return await self.allocation_profiler.profile(
+                self, scope, receive, send
+            )
+        policy = self.policy
+        if self.router is not None:
+            policy = self.router.lookup(scope["path"], policy)
+            if policy is None:
+                return await self.app(scope, receive, send)
+        if self.metrics is not None:
+            return await self.instrumented_call(
+                scope, receive, send, policy
+            )
+        app_send = (await self.handle_http(scope, send, policy))[2]
+        if app_send is not None:
+            await self.app(scope, receive, app_send)
+
+    async def instrumented_call(
+            self, scope, receive, send, policy: CorsPolicy
+    ) -> None:
+        """
+        Same as ``__call__`` for http scopes, recording outcomes and
+        middleware self-time in ``self.metrics``.
+        """
+        metrics = self.metrics
+        clock = metrics.clock
+        started = clock()
+        outcome, failures, app_send = await self.handle_http(
+            scope, send, policy, clock
+        )
+        elapsed = clock() - started
+        if app_send is None:
+            metrics.observe(outcome, elapsed, failures)
+            return
+        try:
+            await self.app(scope, receive, app_send)
+        finally:
+            if isinstance(app_send, TimedSimpleResponseSend):
+                elapsed += app_send.elapsed
+            metrics.observe(outcome, elapsed)
 
-        method = scope["method"]
-        headers = Headers(scope=scope)
-        origin = headers.get("origin")
+    async def handle_http(
+            self, scope, send, policy: CorsPolicy, clock=None
+    ) -> typing.Tuple[str, typing.Tuple[str, ...], typing.Any]:
+        """
+        Handles the CORS side of an http request. Returns the outcome, the
+        reasons a preflight was refused and the ``send`` callable to run the
+        app with, or None when the middleware answered the request itself.
+        With a ``clock``, the time spent rewriting the app's response
+        headers is accumulated by the returned ``send``.
+        """
+        origin, has_cookie, request_method, request_headers = \
+            scan_request_headers(scope["headers"])
 
         if origin is None:
-            return await self.app(scope, receive, send)
+            return "passthrough", (), send
 
-        if method == "OPTIONS":
-            if "access-control-request-method" in headers:
-                response = self.preflight_response(request_headers=headers)
-                await response(scope, receive, send)
-                return
+        is_options = scope["method"] == "OPTIONS"
+        if is_options and request_method is None:
             # if this is an options request but was not a cors preflight,
             #  we should skip the simple response processing.
-            return await self.app(scope, receive, send)
+            return "passthrough", (), send
+
+        throttle = self.preflight_throttle
+        if is_options and throttle is not None and throttle.blocked(origin):
+            await throttle.send_throttled(send)
+            return "preflight_throttled", (), None
+
+        decision = None
+        if self.origin_provider is not None:
+            decision = await self.provider_decision(origin, policy)
+
+        if not is_options:
+            return await self.simple_response(
+                scope, send, origin=origin, has_cookie=has_cookie,
+                policy=policy, decision=decision, clock=clock,
+            )
 
-        await self.simple_response(
-            scope, receive, send, request_headers=headers
+        failures = (await self.send_preflight_response(
+            send, origin, request_method, request_headers, policy, decision,
+        ))[2]
+        if failures:
+            # only disallowed origins are charged: anyone can send a bad
+            #  method with an allowed Origin and lock that origin out.
+            if throttle is not None and "origin" in failures:
+                throttle.charge(origin)
+        elif self.metrics is not None and self.metrics.origins is not None:
+            self.metrics.observe_origin(origin, preflight=True)
+        if self.decision_log is not None:
+            self.decision_log.record(
+                "preflight", scope, origin, not failures, failures,
+                request_method, request_headers,
+            )
+        return (
+            "preflight_403" if failures else "preflight_204", failures, None
         )
 
-    def is_allowed_origin(self, origin: str) -> bool:
-        if self.allow_all_origins:
+    async def websocket_handshake(self, scope, receive, send) -> None:
+        """
+        Closes websocket handshakes from disallowed origins before the app
+        sees them; the server answers those handshakes with a 403.
+        Handshakes without an Origin header don't come from a browser and
+        are passed through.
+        """
+        policy = self.policy
+        if self.router is not None:
+            policy = self.router.lookup(scope["path"], policy)
+            if policy is None:
+                return await self.app(scope, receive, send)
+
+        origin = scan_request_headers(scope["headers"])[0]
+        if origin is None:
+            return await self.app(scope, receive, send)
+        allowed = self.origin_decision(origin, policy)[0]
+        if not allowed and self.origin_provider is not None:
+            allowed = await self.origin_provider(origin.decode("latin-1"))
+        if self.decision_log is not None:
+            self.decision_log.record(
+                "websocket", scope, origin, allowed,
+                () if allowed else ORIGIN_FAILURE,
+            )
+        if allowed:
+            return await self.app(scope, receive, send)
+
+        # consume the websocket.connect message before rejecting.
+        await receive()
+        await send({"type": "websocket.close", "code": WS_POLICY_VIOLATION})
+
+    def swap_policy(self, policy: CorsPolicy) -> None:
+        """
+        Replaces the active policy. Requests read the policy at the start
+        of each step, so they see either the old or the new policy, never a
+        mix of both; cached decisions made under the old policy are dropped.
+        """
+        self.policy = policy
+        self.clear_caches()
+
+    def clear_caches(self) -> None:
+        for cache in (
+            self.decision_cache, self.preflight_cache,
+            self.request_headers_cache,
+        ):
+            if cache is not None:
+                cache.clear()
+        if self.preflight_throttle is not None:
+            self.preflight_throttle.clear()
+
+    def is_allowed_origin(
+            self, origin: str, policy: typing.Optional[CorsPolicy] = None
+    ) -> bool:
+        if policy is None:
+            policy = self.policy
+        if policy.allow_all_origins:
             return True
 
-        if self.allow_origin_regex is not None and \
-                self.allow_origin_regex.fullmatch(origin):
+        if origin in policy.origin_index:
+            return True
+        if policy.origin_store is not None and origin in policy.origin_store:
             return True
 
-        return any(host in origin for host in self.origins)
+        if policy.allow_origin_regex is None:
+            return False
+        if self.metrics is not None:
+            self.metrics.regex_evaluations += 1
+        return policy.allow_origin_regex.fullmatch(origin)
 
-    def preflight_response(self, request_headers) -> Response:
-        requested_origin = request_headers["origin"]
-        requested_method = request_headers["access-control-request-method"]
-        requested_headers = request_headers.get(
-            "access-control-request-headers"
-        )
+    def origin_decision(
+            self, origin: bytes, policy: typing.Optional[CorsPolicy] = None
+    ) -> typing.Tuple[bool, typing.Tuple[typing.Tuple[bytes, bytes], ...]]:
+        """
+        Returns whether the raw ``origin`` header value is allowed along with
+        the CORS headers a simple response to it should carry. Decisions are
+        memoized in the decision cache when one is configured.
+        """
+        if policy is None:
+            policy = self.policy
+        cache = self.decision_cache
+        if policy.origin_store is not None:
+            # the store's file can be replaced at any time, lookups are
+            #  cheap enough not to cache them.
+            cache = None
+        if cache is not None:
+            # decisions for routed policies share the cache, keyed on the
+            #  policy as well.
+            key = origin if policy is self.policy else (policy, origin)
+            decision = cache.get(key)
+            if decision is not None:
+                return decision
+
+        allowed = self.is_allowed_origin(origin.decode("latin-1"), policy)
+        headers = policy.simple_raw_headers
+        if allowed and not policy.allow_all_origins:
+            headers = headers + ((ALLOW_ORIGIN_HEADER, origin),)
+        decision = (allowed, headers)
+
+        if cache is not None:
+            cache.set(key, decision)
+        return decision
 
-        headers = dict(self.preflight_headers)
+    async def provider_decision(
+            self, origin: bytes, policy: CorsPolicy
+    ) -> typing.Optional[typing.Tuple[bool, tuple]]:
+        """
+        Asks ``origin_provider`` about origins the policy doesn't allow.
+        Returns None when the policy allows ``origin``, otherwise a decision
+        like ``origin_decision``'s which must not be cached: the provider
+        keeps its own TTL cache.
+        """
+        if self.origin_decision(origin, policy)[0]:
+            return None
+        headers = policy.simple_raw_headers
+        if await self.origin_provider(origin.decode("latin-1")):
+            return True, headers + ((ALLOW_ORIGIN_HEADER, origin),)
+        return False, headers
+
+    def preflight_response(
+            self,
+            origin: bytes,
+            requested_method: bytes,
+            requested_headers: typing.Optional[bytes] = None,
+            policy: typing.Optional[CorsPolicy] = None,
+            decision: typing.Optional[typing.Tuple[bool, tuple]] = None,
+    ) -> typing.Tuple[dict, dict, typing.Tuple[str, ...]]:
+        """
+        Builds the ``http.response.start`` and ``http.response.body``
+        messages answering a preflight request, along with the reasons it
+        is refused (empty when it's allowed). Only the per-request lines
+        are encoded here; the rest come from ``preflight_raw_headers``.
+        """
+        if policy is None:
+            policy = self.policy
+        requested_method = requested_method.decode("latin-1")
         failures = []
 
-        if self.is_allowed_origin(origin=requested_origin):
-            if not self.allow_all_origins:
-                headers["Access-Control-Allow-Origin"] = requested_origin
+        if decision is None:
+            decision = self.origin_decision(origin, policy)
+        if decision[0] and policy.max_age_tiers:
+            headers = list(
+                policy.origin_preflight_headers(origin.decode("latin-1"))
+            )
+        else:
+            headers = list(policy.preflight_raw_headers)
+        if decision[0]:
+            if not policy.allow_all_origins:
+                headers.append((ALLOW_ORIGIN_HEADER, origin))
+                if self.origin_provider is not None and \
+                        not policy.vary_origin:
+                    headers.append(VARY_ORIGIN)
         else:
             failures.append("origin")
 
-        if requested_method not in self.allow_methods:
+        if requested_method not in policy.allow_methods:
             failures.append("method")
 
-        if self.allow_all_headers and requested_headers is not None:
-            headers["Access-Control-Allow-Headers"] = requested_headers
-        elif requested_headers is not None:
-            for header in [h.lower() for h in requested_headers.split(",")]:
-                requested_header = header.strip()
-                if requested_header not in self.allow_headers and requested_method not in SAFELISTED_HEADERS:
-                    failures.append("headers")
+        if requested_headers is not None:
+            if not self.allowed_request_headers(requested_headers, policy):
+                failures.append("headers")
+            elif policy.allow_all_headers:
+                headers.append((ALLOW_HEADERS_HEADER, requested_headers))
 
+        status = 204
+        body = b""
         if failures:
-            failure_text = "Disallowed CORS " + ", ".join(failures)
-            return PlainTextResponse(
-                failure_text, status_code=403, headers=headers
+            status = 403
+            body = PREFLIGHT_FAILURE_PREFIX + ", ".join(failures).encode()
+            headers.append(FAILURE_CONTENT_TYPE)
+            headers.append((b"content-length", str(len(body)).encode()))
+
+        return (
+            {"type": "http.response.start", "status": status,
+             "headers": headers},
+            {"type": "http.response.body", "body": body},
+            tuple(failures),
+        )
+
+    def allowed_request_headers(
+            self, requested_headers: bytes, policy: CorsPolicy
+    ) -> bool:
+        """
+        Validates an Access-Control-Request-Headers value against the
+        policy, memoizing the answer for values seen before.
+        """
+        cache = self.request_headers_cache
+        if cache is not None:
+            key = requested_headers if policy is self.policy \
+                else (policy, requested_headers)
+            allowed = cache.get(key)
+            if allowed is not None:
+                return allowed
+
+        allowed = validate_request_headers(
+            requested_headers,
+            policy.request_headers,
+            policy.max_request_headers,
+            policy.max_request_headers_length,
+        )
+        if cache is not None:
+            cache.set(key, allowed)
+        return allowed
+
+    async def send_preflight_response(
+            self,
+            send,
+            origin: bytes,
+            requested_method: bytes,
+            requested_headers: typing.Optional[bytes],
+            policy: typing.Optional[CorsPolicy] = None,
+            decision: typing.Optional[typing.Tuple[bool, tuple]] = None,
+    ) -> typing.Tuple[dict, dict, typing.Tuple[str, ...]]:
+        if policy is None:
+            policy = self.policy
+        cache = self.preflight_cache
+        # decisions made by the origin provider expire and the origin store
+        #  may be replaced, don't cache them.
+        if cache is None or decision is not None or \
+                policy.origin_store is not None:
+            response = self.preflight_response(
+                origin, requested_method, requested_headers, policy, decision
             )
+            await send(response[0])
+            await send(response[1])
+            return response
 
-        return Response("", status_code=204, headers=headers)
+        key = (origin, requested_method, requested_headers)
+        if policy is not self.policy:
+            key += (policy,)
+        response = cache.get(key)
+        if response is None:
+            response = self.preflight_response(
+                origin, requested_method, requested_headers, policy
+            )
+            cache.set(key, response)
+        start, body, _ = response
+        # cached messages are shared, hand out copies so nothing downstream
+        #  can mutate them.
+        await send({
+            "type": "http.response.start",
+            "status": start["status"],
+            "headers": list(start["headers"]),
+        })
+        await send({"type": "http.response.body", "body": body["body"]})
+        return response
 
     async def simple_response(
             self,
             scope,
-            receive,
             send,
-            request_headers
-    ) -> None:
-        send = functools.partial(
-            self.send, send=send, request_headers=request_headers
+            origin: bytes,
+            has_cookie: bool = False,
+            policy: typing.Optional[CorsPolicy] = None,
+            decision: typing.Optional[typing.Tuple[bool, tuple]] = None,
+            clock=None,
+    ) -> typing.Tuple[str, typing.Tuple[str, ...], typing.Any]:
+        """
+        Handles a simple request; returns like ``handle_http``.
+        """
+        allowed, headers, vary = self.simple_decision(
+            origin, has_cookie, policy, decision
         )
-        return await self.app(scope, receive, send)
+        if self.decision_log is not None:
+            self.decision_log.record(
+                "simple", scope, origin, allowed,
+                () if allowed else ORIGIN_FAILURE,
+            )
+        if not allowed:
+            if self.should_reject(scope):
+                await self.send_rejection(send)
+                return "simple_rejected", (), None
+        elif self.metrics is not None and self.metrics.origins is not None:
+            self.metrics.observe_origin(origin, preflight=False)
+        if clock is None:
+            send = SimpleResponseSend(send, headers, vary)
+        else:
+            send = TimedSimpleResponseSend(send, headers, vary, clock)
+        return "simple_allowed" if allowed else "simple_denied", (), send
 
-    async def send(self, message, send, request_headers) -> None:
-        if message["type"] != "http.response.start":
-            await send(message)
-            return
+    def should_reject(self, scope) -> bool:
+        """
+        Whether a simple request from a disallowed origin is answered with a
+        403 instead of being passed to the app.
+        """
+        if not self.reject_disallowed_simple:
+            return False
+        if self.reject_unsafe_methods_only and scope["method"] in SAFE_METHODS:
+            return False
+        if self.reject_paths:
+            path = scope["path"]
+            return any(
+                path == prefix or path.startswith(prefix + "/")
+                for prefix in self.reject_paths
+            )
+        return True
 
-        message.setdefault("headers", [])
-        headers = MutableHeaders(scope=message)
-        headers.update(self.simple_headers)
-        origin = request_headers["Origin"]
-        has_cookie = "cookie" in request_headers
-
-        if self.allow_all_origins and has_cookie:
-            headers["Access-Control-Allow-Origin"] = origin
-
-        elif not self.allow_all_origins and \
-                self.is_allowed_origin(origin=origin):
-            headers["Access-Control-Allow-Origin"] = origin
-            if len(self.origins) > 1 or self.allow_origin_regex is not None:
-                headers.add_vary_header("Origin")
-        await send(message)
+    async def send_rejection(self, send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 403,
+            "headers": list(REJECTED_SIMPLE_HEADERS),
+        })
+        await send({"type": "http.response.body", "body": REJECTED_SIMPLE_BODY})
+
+    def simple_decision(
+            self,
+            origin: bytes,
+            has_cookie: bool,
+            policy: typing.Optional[CorsPolicy] = None,
+            decision: typing.Optional[typing.Tuple[bool, tuple]] = None,
+    ):
+        """
+        Returns ``(allowed, headers, vary)`` for a simple request: the raw
+        CORS headers to add to the response and whether to vary on Origin.
+        """
+        if policy is None:
+            policy = self.policy
+        if decision is None:
+            decision = self.origin_decision(origin, policy)
+        allowed, headers = decision
+        vary = False
+        if policy.allow_all_origins:
+            if has_cookie:
+                headers = policy.simple_raw_headers_without_origin + (
+                    (ALLOW_ORIGIN_HEADER, origin),
+                )
+        elif allowed:
+            # origins allowed by the provider make the response depend on
+            #  the Origin even when the policy lists a single origin.
+            vary = policy.vary_origin or self.origin_provider is not None
+        return allowed, headers, vary
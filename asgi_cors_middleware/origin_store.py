@@ -0,0 +1,267 @@
+"""
+Compact on-disk origin list that worker processes share through mmap.
+
+The file holds a header, an open-addressing hash table and the origins
+themselves, normalized to ``scheme://host:port``, sorted and prefixed with
+their length::
+
+    header   magic (8 bytes), origin count, table size (little-endian u32)
+    table    table size u32 slots, 0 for an empty slot or 1 + the offset of
+             an origin record from the start of the records
+    records  u16 length + origin bytes, for each origin
+
+Build one from a text file holding one origin per line with::
+
+    python -m asgi_cors_middleware.origin_store origins.txt origins.cors
+"""
+
+import mmap
+import os
+import struct
+import time
+import typing
+import zlib
+
+from .origins import DEFAULT_PORTS, parse_origin, parse_origin_entry
+
+MAGIC = b"CORSMAP1"
+HEADER = struct.Struct("<8sII")
+SLOT = struct.Struct("<I")
+LENGTH = struct.Struct("<H")
+
+
+def origin_key(scheme: str, host: str, port: int) -> bytes:
+    return "{}://{}:{}".format(scheme, host, port).encode("latin-1")
+
+
+def normalize_entry(entry: str) -> bytes:
+    """
+    Normalizes a listed origin, which must have a scheme and no wildcard.
+    """
+    key = parse_origin_entry(entry)
+    if key is None or key[0] is None or "*" in key[1]:
+        raise ValueError("Invalid origin: {!r}".format(entry))
+    scheme, host, port = key
+    if port is None:
+        port = DEFAULT_PORTS.get(scheme)
+        if port is None:
+            raise ValueError("Invalid origin: {!r}".format(entry))
+    try:
+        return origin_key(scheme, host, port)
+    except UnicodeEncodeError:
+        raise ValueError("Invalid origin: {!r}".format(entry)) from None
+
+
+def build_origin_store(origins: typing.Iterable[str], path: str) -> int:
+    """
+    Writes the store for ``origins`` to ``path`` and returns the number of
+    distinct origins. The file is written next to ``path`` and renamed over
+    it, so processes reading the store never see a partial file.
+    """
+    keys = sorted({normalize_entry(origin) for origin in origins})
+    table_size = 1
+    while table_size < 2 * len(keys):
+        table_size *= 2
+    mask = table_size - 1
+
+    records = bytearray()
+    table = [0] * table_size
+    for key in keys:
+        if len(key) > 0xFFFF:
+            raise ValueError("Origin too long: {!r}".format(key))
+        slot = zlib.crc32(key) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = len(records) + 1
+        records += LENGTH.pack(len(key)) + key
+
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(keys), table_size))
+        f.write(struct.pack("<{}I".format(table_size), *table))
+        f.write(records)
+    os.replace(temporary, path)
+    return len(keys)
+
+
+class MappedOriginStore:
+    """
+    Read-only set of origins backed by a memory-mapped store file.
+
+    Lookups hash the normalized origin and compare it with the records in
+    place, so no Python objects are created for the listed origins and
+    every process mapping the file shares the same pages.
+
+    The file's identity is checked at most every ``check_interval``
+    seconds. When it was replaced (see ``build_origin_store``) the new file
+    is mapped, so every worker picks up a new list on its own.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        check_interval: float = 1.0,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self.clock = clock
+        self.file_id = None
+        self.failed_file_id = None
+        self.map = None
+        self.count = 0
+        self.mask = 0
+        self.records_offset = 0
+        self.reloads = 0
+        self.load()
+        self.next_check = self.clock() + check_interval
+
+    def load(self) -> None:
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            count, table_size = self.validate(mapped)
+        except Exception:
+            mapped.close()
+            raise
+        previous, self.map = self.map, mapped
+        self.file_id = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+        self.count = count
+        self.mask = table_size - 1
+        self.records_offset = HEADER.size + SLOT.size * table_size
+        if previous is not None:
+            previous.close()
+
+    def validate(self, mapped) -> typing.Tuple[int, int]:
+        """
+        Checks the layout of a mapped store and returns its origin count and
+        table size.
+        """
+        if len(mapped) < HEADER.size:
+            raise ValueError("{}: not an origin store".format(self.path))
+        magic, count, table_size = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            raise ValueError("{}: not an origin store".format(self.path))
+        # the builder keeps the table at most half full, so lookups always
+        #  reach an empty slot.
+        if table_size < 1 or table_size & (table_size - 1) or \
+                2 * count > table_size:
+            raise ValueError("{}: invalid hash table".format(self.path))
+        records_offset = HEADER.size + SLOT.size * table_size
+        if len(mapped) < records_offset:
+            raise ValueError("{}: truncated origin store".format(self.path))
+        # the header's count may lie: check that lookups of missing origins
+        #  reach an empty slot. In a valid table one comes within the first
+        #  few slots.
+        with memoryview(mapped) as view, \
+                view[HEADER.size:records_offset].cast("I") as slots:
+            has_empty_slot = 0 in slots
+        if not has_empty_slot:
+            raise ValueError("{}: invalid hash table".format(self.path))
+        # records take at least their length prefix. Offsets read from the
+        #  table are bounds-checked by lookups, which also never probe a
+        #  slot twice.
+        if len(mapped) < records_offset + LENGTH.size * count:
+            raise ValueError("{}: truncated origin store".format(self.path))
+        return count, table_size
+
+    def refresh(self) -> bool:
+        """
+        Maps the file again if it was replaced and returns whether it was.
+        A replacement that can't be loaded is logged once and the current
+        map is kept.
+        """
+        self.next_check = self.clock() + self.check_interval
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        file_id = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+        if file_id in (self.file_id, self.failed_file_id):
+            return False
+        try:
+            self.load()
+        except (OSError, ValueError, struct.error):
+            self.failed_file_id = file_id
+            import logging
+
+            logging.getLogger(__name__).exception(
+                "Failed to load origin store %s, keeping the previous one",
+                self.path,
+            )
+            return False
+        self.reloads += 1
+        return True
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, origin: str) -> bool:
+        if self.clock() >= self.next_check:
+            self.refresh()
+        key = parse_origin(origin)
+        # stored origins always have a port.
+        if key is None or key[2] is None or not self.count:
+            return False
+        try:
+            key = origin_key(*key)
+        except UnicodeEncodeError:
+            return False
+
+        mapped = self.map
+        mask = self.mask
+        records_offset = self.records_offset
+        size = len(mapped)
+        length = len(key)
+        slot = zlib.crc32(key) & mask
+        for _ in range(mask + 1):
+            entry = SLOT.unpack_from(mapped, HEADER.size + 4 * slot)[0]
+            if not entry:
+                return False
+            offset = records_offset + entry - 1
+            if offset + LENGTH.size > size:
+                return False
+            if LENGTH.unpack_from(mapped, offset)[0] == length and \
+                    mapped[offset + 2:offset + 2 + length] == key:
+                return True
+            slot = (slot + 1) & mask
+        return False
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def __getstate__(self):
+        return {"path": self.path, "check_interval": self.check_interval}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["check_interval"])
+
+
+def read_origin_list(path: str) -> typing.List[str]:
+    """
+    Reads one origin per line, skipping blank lines and ``#`` comments.
+    """
+    with open(path) as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build a memory-mappable origin store from a text file "
+                    "holding one origin per line."
+    )
+    parser.add_argument("origins", help="text file listing the origins")
+    parser.add_argument("store", help="store file to write")
+    args = parser.parse_args(argv)
+    count = build_origin_store(read_origin_list(args.origins), args.store)
+    print("{}: {} origins".format(args.store, count))
+
+
+if __name__ == "__main__":
+    main()
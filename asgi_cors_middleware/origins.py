@@ -0,0 +1,393 @@
+"""
+Compiled origin matching used by CorsASGIApp.
+"""
+
+import gc
+import re
+import types
+import typing
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+DEFAULT_PORTS = {"http": 80, "https": 443, "ws": 80, "wss": 443}
+GROUP_REFERENCES = (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS)
+WILDCARD_LABEL = "*"
+# serialization of an opaque origin (sandboxed iframes, file: URLs, ...).
+NULL_ORIGIN = "null"
+# key of a wildcard trie node holding the (scheme, port) rules of the
+#  wildcard entries ending at that node. Host labels are never empty.
+RULES = ""
+
+
+def _split_host_port(netloc: str):
+    if netloc.startswith("["):
+        end = netloc.find("]")
+        if end == -1:
+            return None
+        host, rest = netloc[:end + 1], netloc[end + 1:]
+        if not rest:
+            return host, None
+        if not rest.startswith(":"):
+            return None
+        port = rest[1:]
+    else:
+        host, sep, port = netloc.partition(":")
+        if not sep:
+            return host, None
+    if not port.isdigit():
+        return None
+    return host, int(port)
+
+
+def parse_origin(
+        origin: str
+) -> typing.Optional[typing.Tuple[str, str, typing.Optional[int]]]:
+    """
+    Parse a serialized Origin header value into a (scheme, host, port) key.
+    The port is None for schemes without a default port that don't name
+    one (e.g. "capacitor://localhost"), like the keys of such configured
+    origins. Returns None for opaque or malformed origins (e.g. "null").
+    """
+    scheme, sep, netloc = origin.partition("://")
+    if not sep or not scheme or not netloc:
+        return None
+    scheme = scheme.lower()
+    parts = _split_host_port(netloc.lower())
+    if parts is None or not parts[0]:
+        return None
+    host, port = parts
+    if port is None:
+        port = DEFAULT_PORTS.get(scheme)
+    return scheme, host, port
+
+
+def parse_origin_entry(entry: str):
+    """
+    Parse a configured origin into (scheme, host, port). Entries may omit
+    the scheme ("www.example.com", "localhost:9000"), in which case scheme
+    is None, and may omit the port, in which case port is None.
+    """
+    entry = entry.strip().rstrip("/")
+    scheme, sep, netloc = entry.partition("://")
+    if not sep:
+        scheme, netloc = None, entry
+    elif not scheme:
+        return None
+    else:
+        scheme = scheme.lower()
+    parts = _split_host_port(netloc.lower())
+    if parts is None or not parts[0] or "/" in parts[0]:
+        return None
+    host, port = parts
+    if scheme is not None and port is None:
+        port = DEFAULT_PORTS.get(scheme)
+    return scheme, host, port
+
+
+class OriginIndex:
+    """
+    Set of allowed origins answering membership in O(1).
+
+    Fully qualified entries ("https://example.com") are stored as
+    (scheme, host, port) keys. Entries without a scheme match that host on
+    any scheme; without a port they match the scheme's default port.
+
+    Entries whose host starts with a ``*`` label ("https://*.example.com")
+    match any subdomain of the rest of the host, at any depth, but not the
+    domain itself. They are stored in a trie keyed by the host labels in
+    reverse order, so matching walks at most one node per label of the
+    origin's host whatever the number of wildcard entries.
+
+    With ``substring=True`` the index keeps the historical behaviour of
+    allowing any origin that contains one of the entries.
+
+    A ``*`` entry isn't indexed but sets ``allow_all``; ``entries`` counts
+    every entry added, ``*`` included. A ``null`` entry sets ``allow_null``
+    and allows the opaque origin ``null``, which has no scheme, host or port
+    to look up.
+
+    Keys are held in dicts and the trie's nodes are read-only mappings from
+    the start, holding frozensets of rules. ``freeze()`` wraps the key dicts
+    in read-only mappings, which takes constant time whatever the size of
+    the index, and the index can no longer be updated.
+    """
+
+    __slots__ = (
+        "substring", "substrings", "exact", "any_scheme", "wildcards",
+        "allow_all", "allow_null", "entries", "frozen",
+    )
+
+    def __init__(
+        self, origins: typing.Iterable[str] = (), substring: bool = False
+    ) -> None:
+        self.substring = substring
+        self.substrings = ()
+        self.exact = {}
+        self.any_scheme = {}
+        self.wildcards = types.MappingProxyType({})
+        self.allow_all = False
+        self.allow_null = False
+        self.entries = 0
+        self.frozen = False
+
+        self.update(origins)
+
+    def update(self, origins: typing.Iterable[str]) -> None:
+        """
+        Adds ``origins`` to the index. Large lists can be fed in chunks so
+        that building the index can be interleaved with other work.
+        """
+        if self.frozen:
+            raise TypeError("A frozen OriginIndex can't be updated")
+        origins = list(origins)
+        self.entries += len(origins)
+        if "*" in origins:
+            self.allow_all = True
+            origins = [origin for origin in origins if origin != "*"]
+        if self.substring:
+            self.substrings += tuple(origins)
+            return
+
+        for origin in origins:
+            if origin == NULL_ORIGIN:
+                self.allow_null = True
+                continue
+            key = parse_origin_entry(origin)
+            if key is None:
+                raise ValueError("Invalid origin: {!r}".format(origin))
+            scheme, host, port = key
+            if WILDCARD_LABEL in host:
+                self.add_wildcard(origin, scheme, host, port)
+            elif scheme is None:
+                self.any_scheme[host, port] = None
+            else:
+                self.exact[key] = None
+
+    def add_wildcard(self, origin, scheme, host, port) -> None:
+        labels = host.split(".")
+        if labels[0] != WILDCARD_LABEL or len(labels) < 2 or \
+                WILDCARD_LABEL in labels[1:] or "" in labels:
+            raise ValueError("Invalid origin: {!r}".format(origin))
+        self.add_rule(tuple(reversed(labels[1:])), (scheme, port))
+
+    def add_rule(self, path: typing.Tuple[str, ...], rule) -> None:
+        """
+        Adds a (scheme, port) rule to the trie node at ``path``, creating
+        the missing nodes on the way.
+        """
+        node = _node_dict(self.wildcards)
+        for label in path:
+            child = node.get(label)
+            if child is None:
+                child = node[label] = types.MappingProxyType({})
+            node = _node_dict(child)
+        node[RULES] = node.get(RULES, frozenset()).union((rule,))
+
+    def freeze(self) -> "OriginIndex":
+        if not self.frozen:
+            self.exact = types.MappingProxyType(self.exact)
+            self.any_scheme = types.MappingProxyType(self.any_scheme)
+            self.frozen = True
+        return self
+
+    def __getstate__(self):
+        # read-only mappings can't be pickled, they're rebuilt on loading.
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state["exact"] = dict(self.exact)
+        state["any_scheme"] = dict(self.any_scheme)
+        state["wildcards"] = list(_trie_rules(self.wildcards, ()))
+        return state
+
+    def __setstate__(self, state):
+        rules = state.pop("wildcards")
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.wildcards = types.MappingProxyType({})
+        for path, rule in rules:
+            self.add_rule(path, rule)
+        if self.frozen:
+            self.frozen = False
+            self.freeze()
+
+    def __len__(self) -> int:
+        return len(self.substrings) + len(self.exact) + \
+            len(self.any_scheme) + _count_rules(self.wildcards) + \
+            self.allow_null
+
+    def match_wildcard(self, scheme: str, host: str, port: int) -> bool:
+        node = self.wildcards
+        labels = host.split(".")
+        # the first label is what the wildcard stands for, so it's never
+        #  looked up.
+        for index in range(len(labels) - 1, 0, -1):
+            node = node.get(labels[index])
+            if node is None:
+                return False
+            rules = node.get(RULES)
+            # entries without a scheme never match schemes without a
+            #  default port.
+            if rules is not None and (
+                (scheme, port) in rules or port is not None and (
+                    (None, port) in rules or
+                    port == DEFAULT_PORTS.get(scheme) and
+                    (None, None) in rules
+                )
+            ):
+                return True
+        return False
+
+    def __contains__(self, origin: str) -> bool:
+        if self.substring:
+            return any(host in origin for host in self.substrings)
+
+        key = parse_origin(origin)
+        if key is None:
+            return self.allow_null and origin == NULL_ORIGIN
+        if key in self.exact:
+            return True
+        scheme, host, port = key
+        if self.any_scheme and port is not None:
+            if (host, port) in self.any_scheme:
+                return True
+            if port == DEFAULT_PORTS.get(scheme) and \
+                    (host, None) in self.any_scheme:
+                return True
+        if self.wildcards:
+            return self.match_wildcard(scheme, host, port)
+        return False
+
+
+def _node_dict(node: types.MappingProxyType) -> dict:
+    # the dict a trie node is a read-only view of, and the view's only
+    #  referent. Keeping the dicts anywhere else would cost as much to free
+    #  as the trie once the index is frozen.
+    return gc.get_referents(node)[0]
+
+
+def _trie_rules(node: typing.Mapping, path: typing.Tuple[str, ...]):
+    for label, child in node.items():
+        if label == RULES:
+            for rule in child:
+                yield path, rule
+        else:
+            yield from _trie_rules(child, path + (label,))
+
+
+def _count_rules(node: typing.Mapping) -> int:
+    return sum(
+        len(child) if label == RULES else _count_rules(child)
+        for label, child in node.items()
+    )
+
+
+def literal_suffix(pattern: str) -> typing.Tuple[str, bool]:
+    """
+    Returns the literal text every match of ``pattern`` must end with, and
+    whether the pattern is made of nothing but that literal.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return "", False
+    if parsed.state.flags & ~re.UNICODE:
+        return "", False
+
+    items = list(parsed)
+    while items and items[-1] == (sre_parse.AT, sre_parse.AT_END):
+        items.pop()
+    chars = []
+    for op, av in reversed(items):
+        if op is not sre_parse.LITERAL:
+            break
+        chars.append(chr(av))
+    suffix = "".join(reversed(chars))
+    return suffix, len(chars) == len(items)
+
+
+def _refers_to_groups(value) -> bool:
+    if isinstance(value, sre_parse.SubPattern):
+        return any(
+            op in GROUP_REFERENCES or _refers_to_groups(av)
+            for op, av in value
+        )
+    if isinstance(value, (tuple, list)):
+        return any(_refers_to_groups(item) for item in value)
+    return False
+
+
+def refers_to_groups(pattern: str) -> bool:
+    """
+    Whether ``pattern`` holds a backreference or a conditional on a group.
+    """
+    return _refers_to_groups(sre_parse.parse(pattern))
+
+
+class OriginRegexMatcher:
+    """
+    Matches origins against several regular expressions at once.
+
+    Patterns made of plain literals are answered with a set lookup. The rest
+    are joined into a single alternation; when every one of them ends in a
+    literal suffix (e.g. ``\\.example\\.com``), origins that don't end in
+    one of those suffixes are rejected without running the regex.
+
+    Patterns that can't be joined are compiled on their own: those setting
+    global inline flags such as ``(?i)``, and those with named groups or
+    backreferences, since joining renumbers the groups.
+    """
+
+    __slots__ = (
+        "patterns", "literals", "suffixes", "prefilter", "standalone",
+        "regex",
+    )
+
+    def __init__(self, patterns: typing.Union[str, typing.Sequence[str]]):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        self.patterns = tuple(patterns)
+
+        literals = set()
+        suffixes = set()
+        regexes = []
+        standalone = []
+        prefilter = True
+        for pattern in self.patterns:
+            compiled = re.compile(pattern)
+            if compiled.flags & ~re.UNICODE or compiled.groupindex or \
+                    refers_to_groups(pattern):
+                standalone.append(compiled)
+                continue
+            suffix, is_literal = literal_suffix(pattern)
+            if is_literal:
+                literals.add(suffix)
+                continue
+            regexes.append(pattern)
+            if suffix:
+                suffixes.add(suffix)
+            else:
+                prefilter = False
+
+        self.literals = frozenset(literals)
+        self.suffixes = tuple(sorted(suffixes))
+        self.prefilter = prefilter
+        self.standalone = tuple(standalone)
+        self.regex = None
+        if regexes:
+            self.regex = re.compile(
+                "|".join("(?:{})".format(pattern) for pattern in regexes)
+            )
+
+    def fullmatch(self, origin: str) -> bool:
+        if origin in self.literals:
+            return True
+        for regex in self.standalone:
+            if regex.fullmatch(origin) is not None:
+                return True
+        if self.regex is None:
+            return False
+        if self.prefilter and not origin.endswith(self.suffixes):
+            return False
+        return self.regex.fullmatch(origin) is not None
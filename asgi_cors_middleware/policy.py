@@ -0,0 +1,399 @@
+"""
+Compiled CORS policies and hot reloading of a policy from a file.
+"""
+
+import gc
+import os
+import typing
+
+from .headers import MAX_REQUEST_HEADERS, MAX_REQUEST_HEADERS_LENGTH
+from .origins import OriginIndex, OriginRegexMatcher
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from .origin_store import MappedOriginStore
+
+# OPTIONS doesn't make sense to return as an allowed method for CORS.
+# See https://stackoverflow.com/a/68529748
+ALL_METHODS = ("DELETE", "GET", "PATCH", "POST", "PUT")
+SAFELISTED_HEADERS = {
+    "Accept", "Accept-Language", "Content-Language", "Content-Type"
+}
+ALLOW_ORIGIN_HEADER = b"access-control-allow-origin"
+MAX_AGE_HEADER = b"access-control-max-age"
+DEFAULT_MAX_AGE = 600
+# Number of origins indexed between two yields to the event loop when a
+# policy is built with CorsPolicy.build_async.
+BUILD_CHUNK_SIZE = 2000
+
+
+def encode_headers(
+        headers: typing.Mapping[str, str]
+) -> typing.List[typing.Tuple[bytes, bytes]]:
+    return [
+        (key.lower().encode("latin-1"), value.encode("latin-1"))
+        for key, value in headers.items()
+    ]
+
+
+class CorsPolicy:
+    """
+    Everything CorsASGIApp computes from its settings: the origin index,
+    the allowed methods and headers and the pre-encoded response headers.
+
+    Policies are immutable and made only of frozensets, read-only mappings,
+    tuples and bytes (plus the compiled origin regexes and an optional
+    memory-mapped ``origin_store``), so a policy built once in a
+    pre-fork master stays shared copy-on-write by its workers; see
+    ``freeze_for_fork``. Policies can be pickled.
+
+    To change the settings of a running middleware, build a new policy and
+    pass it to ``CorsASGIApp.swap_policy``.
+    """
+
+    __slots__ = (
+        "origin_index",
+        "allow_methods",
+        "allow_headers",
+        "allow_all_origins",
+        "allow_all_headers",
+        "allow_origin_regex",
+        "max_age",
+        "simple_raw_headers",
+        "simple_raw_headers_without_origin",
+        "vary_origin",
+        "preflight_raw_headers",
+        "request_headers",
+        "max_request_headers",
+        "max_request_headers_length",
+        "max_age_tiers",
+        "origin_store",
+    )
+
+    def __init__(
+        self,
+        origins: typing.Sequence[str] = (),
+        allow_methods: typing.Sequence[str] = ("GET",),
+        allow_headers: typing.Sequence[str] = (),
+        allow_credentials: bool = False,
+        allow_origin_regex: typing.Union[str, typing.Sequence[str]] = None,
+        expose_headers: typing.Sequence[str] = (),
+        max_age: int = DEFAULT_MAX_AGE,
+        legacy_origin_matching: bool = False,
+        origin_index: typing.Optional[OriginIndex] = None,
+        max_request_headers: int = MAX_REQUEST_HEADERS,
+        max_request_headers_length: int = MAX_REQUEST_HEADERS_LENGTH,
+        max_age_by_origin: typing.Optional[typing.Mapping[str, int]] = None,
+        origin_store: typing.Union[str, "MappedOriginStore", None] = None,
+        tier_indexes: typing.Optional[
+            typing.Mapping[int, OriginIndex]
+        ] = None,
+    ) -> None:
+
+        if "*" in allow_methods:
+            allow_methods = ALL_METHODS
+
+        compiled_allow_origin_regex = None
+        if allow_origin_regex:
+            compiled_allow_origin_regex = OriginRegexMatcher(
+                allow_origin_regex
+            )
+
+        if origin_index is None:
+            origin_index = OriginIndex(
+                origins, substring=legacy_origin_matching
+            )
+        allow_all_origins = origin_index.allow_all
+
+        simple_headers = {}
+        if allow_all_origins:
+            simple_headers["Access-Control-Allow-Origin"] = "*"
+        if allow_credentials:
+            simple_headers["Access-Control-Allow-Credentials"] = "true"
+        if expose_headers:
+            simple_headers["Access-Control-Expose-Headers"] = \
+                ", ".join(expose_headers)
+
+        # the allowed origin is echoed back whenever more than one origin
+        #  may be allowed, so responses vary on Origin.
+        if isinstance(origin_store, str):
+            from .origin_store import MappedOriginStore
+
+            origin_store = MappedOriginStore(origin_store)
+        varies = origin_index.entries > 1 or \
+            compiled_allow_origin_regex is not None or \
+            bool(origin_index.wildcards) or origin_store is not None
+
+        # indexes of the origins listed in max_age_by_origin by max age,
+        #  unless build_async built them already.
+        if tier_indexes is None:
+            tier_indexes = {}
+            add_tier_origins(
+                tier_indexes, (max_age_by_origin or {}).items(), max_age
+            )
+
+        preflight_headers = {}
+        if allow_all_origins:
+            preflight_headers["Access-Control-Allow-Origin"] = "*"
+            if tier_indexes:
+                preflight_headers["Vary"] = "Origin"
+        elif varies:
+            preflight_headers["Vary"] = "Origin"
+        preflight_headers.update(
+            {
+                "Access-Control-Allow-Methods": ", ".join(allow_methods),
+                "Access-Control-Max-Age": str(max_age),
+            }
+        )
+        # re-including normally safelisted headers implies that you want to lift the browsers
+        #  additional restrictions on those headers. we don't want to do that by default.
+        # See https://developer.mozilla.org/en-US/docs/Glossary/CORS-safelisted_request_header#additional_restrictions
+        allow_headers = sorted(set(allow_headers))
+        if allow_headers and "*" not in allow_headers:
+            preflight_headers["Access-Control-Allow-Headers"] = \
+                ", ".join(allow_headers)
+        if allow_credentials:
+            preflight_headers["Access-Control-Allow-Credentials"] = "true"
+
+        simple_raw_headers = tuple(encode_headers(simple_headers))
+
+        set_attribute = super().__setattr__
+        set_attribute("origin_index", origin_index.freeze())
+        set_attribute("allow_methods", frozenset(allow_methods))
+        set_attribute(
+            "allow_headers", frozenset(h.lower() for h in allow_headers)
+        )
+        set_attribute("allow_all_origins", allow_all_origins)
+        set_attribute("allow_all_headers", "*" in allow_headers)
+        set_attribute("allow_origin_regex", compiled_allow_origin_regex)
+        set_attribute("max_age", max_age)
+        set_attribute("simple_raw_headers", simple_raw_headers)
+        set_attribute("simple_raw_headers_without_origin", tuple(
+            (key, value) for key, value in simple_raw_headers
+            if key != ALLOW_ORIGIN_HEADER
+        ))
+        set_attribute("vary_origin", not allow_all_origins and varies)
+        preflight_raw_headers = tuple(encode_headers(preflight_headers))
+        set_attribute("preflight_raw_headers", preflight_raw_headers)
+        # (origins, preflight headers with their max age) for each tier.
+        set_attribute("max_age_tiers", tuple(
+            (
+                tier.freeze(),
+                tuple(
+                    (key, str(tier_max_age).encode())
+                    if key == MAX_AGE_HEADER else (key, value)
+                    for key, value in preflight_raw_headers
+                ),
+            )
+            for tier_max_age, tier in sorted(tier_indexes.items())
+        ))
+        # names a preflight may request, None when any name is allowed.
+        #  safelisted headers have to be listed too: a name missing from
+        #  Access-Control-Allow-Headers is blocked by the browser anyway.
+        request_headers = None
+        if "*" not in allow_headers:
+            request_headers = frozenset(
+                h.lower().encode("latin-1") for h in allow_headers
+            )
+        set_attribute("request_headers", request_headers)
+        set_attribute("origin_store", origin_store)
+        set_attribute("max_request_headers", max_request_headers)
+        set_attribute(
+            "max_request_headers_length", max_request_headers_length
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CorsPolicy is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CorsPolicy is immutable")
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            super().__setattr__(name, value)
+
+    def origin_preflight_headers(
+            self, origin: str
+    ) -> typing.Tuple[typing.Tuple[bytes, bytes], ...]:
+        """
+        The pre-encoded preflight headers for an allowed ``origin``, carrying
+        the max age of the first tier of ``max_age_by_origin`` listing it.
+        """
+        for tier_origins, raw_headers in self.max_age_tiers:
+            if origin in tier_origins:
+                return raw_headers
+        return self.preflight_raw_headers
+
+    @classmethod
+    def from_file(cls, path: str) -> "CorsPolicy":
+        return cls(**load_policy_options(path))
+
+    @classmethod
+    async def build_async(
+        cls,
+        options: typing.Mapping[str, typing.Any],
+        chunk_size: int = BUILD_CHUNK_SIZE,
+    ) -> "CorsPolicy":
+        """
+        Builds a policy from ``options`` without holding the event loop for
+        long: the origin index, then the indexes of ``max_age_by_origin``,
+        are filled ``chunk_size`` origins at a time, yielding to the loop in
+        between. Everything the policy needs to know about the origins is
+        recorded by the indexes while they are filled, and freezing them
+        takes constant time, so the final build doesn't depend on the number
+        of origins.
+        """
+        import asyncio
+        import itertools
+
+        options = dict(options)
+        origins = iter(options.pop("origins", ()))
+        origin_index = OriginIndex(
+            substring=options.get("legacy_origin_matching", False)
+        )
+        while True:
+            chunk = list(itertools.islice(origins, chunk_size))
+            if not chunk:
+                break
+            origin_index.update(chunk)
+            await asyncio.sleep(0)
+
+        tier_indexes = {}
+        max_age = options.get("max_age", DEFAULT_MAX_AGE)
+        items = iter((options.pop("max_age_by_origin", None) or {}).items())
+        while True:
+            chunk = list(itertools.islice(items, chunk_size))
+            if not chunk:
+                break
+            add_tier_origins(tier_indexes, chunk, max_age)
+            await asyncio.sleep(0)
+        return cls(
+            origin_index=origin_index, tier_indexes=tier_indexes, **options
+        )
+
+
+def add_tier_origins(
+        tier_indexes: typing.Dict[int, OriginIndex],
+        items: typing.Iterable[typing.Tuple[str, int]],
+        max_age: int,
+) -> None:
+    """
+    Adds ``(origin, max age)`` pairs of ``max_age_by_origin`` to the index
+    of their max age, skipping those that have the policy's ``max_age``.
+    """
+    tiers = {}
+    for origin, origin_max_age in items:
+        if origin_max_age != max_age:
+            tiers.setdefault(origin_max_age, []).append(origin)
+    for tier_max_age, origins in tiers.items():
+        tier = tier_indexes.get(tier_max_age)
+        if tier is None:
+            tier = tier_indexes[tier_max_age] = OriginIndex()
+        tier.update(origins)
+
+
+def freeze_for_fork() -> None:
+    """
+    Moves every object tracked by the garbage collector, including already
+    built policies, to the permanent generation with ``gc.freeze()``.
+
+    Call it in a pre-fork server's master once the policies are built
+    (e.g. gunicorn's ``pre_fork`` hook with ``preload_app``). Collections
+    in the workers then never touch these objects, so the pages holding
+    large origin tables stay shared copy-on-write.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def load_policy_options(path: str) -> typing.Dict[str, typing.Any]:
+    """
+    Reads policy settings from a JSON file. The file holds an object whose
+    keys are CorsASGIApp's policy arguments, e.g.
+    ``{"origins": ["https://example.com"], "allow_methods": ["GET"]}``.
+    """
+    import json
+
+    with open(path) as f:
+        options = json.load(f)
+    if not isinstance(options, dict):
+        raise ValueError("{}: expected a JSON object".format(path))
+    return options
+
+
+class PolicyFileWatcher:
+    """
+    Polls a policy file's modification time and swaps a rebuilt policy into
+    ``app`` whenever the file changes. Invalid files are logged and the
+    current policy is kept.
+
+    CorsASGIApp starts its watcher on the ASGI lifespan startup event;
+    ``start()`` can be called directly for servers without lifespan support.
+    """
+
+    def __init__(self, app, path: str, interval: float = 1.0) -> None:
+        self.app = app
+        self.path = path
+        self.interval = interval
+        self.mtime = self.stat()
+        self.task = None
+
+    def stat(self) -> typing.Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def start(self) -> None:
+        import asyncio
+
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        import asyncio
+
+        task, self.task = self.task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self) -> None:
+        import asyncio
+
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def check(self) -> bool:
+        """
+        Reloads the policy if the file changed since the last check and
+        returns whether a new policy was swapped in.
+        """
+        mtime = self.stat()
+        if mtime is None or mtime == self.mtime:
+            return False
+        self.mtime = mtime
+
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+        try:
+            options = await loop.run_in_executor(
+                None, load_policy_options, self.path
+            )
+            policy = await CorsPolicy.build_async(options)
+        except Exception:
+            import logging
+
+            logging.getLogger(__name__).exception(
+                "Failed to reload CORS policy from %s", self.path
+            )
+            return False
+        self.app.swap_policy(policy)
+        return True
@@ -0,0 +1,219 @@
+"""
+Opt-in allocation profiling for CorsASGIApp, built on tracemalloc.
+"""
+
+import os
+import typing
+
+from .headers import scan_request_headers
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+REQUEST_TYPES = ("passthrough", "simple", "preflight")
+# qualified name of a middleware function -> code path its allocations are
+#  attributed to. Functions not listed are attributed to the first listed
+#  function up their call stack, or to __call__.
+PATH_OF_FUNCTION = {
+    "CorsASGIApp.preflight_response": "preflight_response",
+    "CorsASGIApp.send_preflight_response": "preflight_response",
+    "CorsASGIApp.allowed_request_headers": "preflight_response",
+    "CorsASGIApp.simple_response": "simple_response",
+    "CorsASGIApp.simple_decision": "simple_response",
+    "CorsASGIApp.send_rejection": "simple_response",
+    "SimpleResponseSend.__call__": "send",
+    "SimpleResponseSend.rewrite": "send",
+    "TimedSimpleResponseSend.__call__": "send",
+}
+
+
+def _line_table(filename: str):
+    """
+    Returns ``(first_line, last_line, qualname)`` for every function and
+    method defined at the top of the package module ``filename``.
+    """
+    import dis
+    import sys
+
+    table = []
+    for module in list(sys.modules.values()):
+        if getattr(module, "__file__", None) != filename:
+            continue
+        for value in vars(module).values():
+            members = [value]
+            if isinstance(value, type):
+                members = list(vars(value).values())
+            for member in members:
+                code = getattr(member, "__code__", None)
+                if code is None or code.co_filename != filename:
+                    continue
+                lines = [line for _, line in dis.findlinestarts(code)
+                         if line is not None]
+                table.append((
+                    code.co_firstlineno, max(lines), member.__qualname__
+                ))
+    return table
+
+
+class AllocationProfiler:
+    """
+    Attributes the memory CorsASGIApp allocates while handling requests to
+    the middleware code path that allocated it, by request type.
+
+    Pass an instance as ``CorsASGIApp(allocation_profiler=...)``. Around
+    each http request a tracemalloc snapshot is taken before the middleware
+    runs, when the response starts and once the request is done. Only
+    allocations made by the package's own code are counted; the wrapped app
+    and the server are excluded. ``report()`` then gives, for each request
+    type:
+
+    * ``live``: memory held by the middleware for the request when the
+      response starts, which is what each in-flight request costs;
+    * ``retained``: memory still held once the request is done, which should
+      stay at zero past the caches' warm-up.
+
+    Both are ``{code_path: {"bytes": ..., "objects": ...}}`` summed over the
+    profiled requests. Snapshots are slow and the accounting assumes one
+    request at a time: requests arriving while another one is profiled are
+    handled without being profiled. This is a debugging aid for tests and
+    benchmarks, not for production traffic.
+    """
+
+    def __init__(self, nframes: int = 32) -> None:
+        self.nframes = nframes
+        self.active = False
+        self.started_tracing = False
+        self.line_tables = {}
+        self.reset()
+
+    def reset(self) -> None:
+        self.requests = dict.fromkeys(REQUEST_TYPES, 0)
+        self.live = {request_type: {} for request_type in REQUEST_TYPES}
+        self.retained = {request_type: {} for request_type in REQUEST_TYPES}
+
+    def stop(self) -> None:
+        """
+        Stops tracemalloc if the profiler started it.
+        """
+        import tracemalloc
+
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def take_snapshot(self):
+        import gc
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            self.started_tracing = True
+        # a full collection also empties the interpreter's free lists, which
+        #  would otherwise keep freed dicts, lists and tuples accounted for.
+        gc.collect()
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(True, os.path.join(PACKAGE_DIR, "*")),
+        ))
+
+    async def profile(self, middleware, scope, receive, send) -> None:
+        """
+        Handles an http request with ``middleware`` while recording its
+        allocations.
+        """
+        origin, _, request_method, _ = scan_request_headers(scope["headers"])
+        if origin is None or (
+                scope["method"] == "OPTIONS" and request_method is None
+        ):
+            request_type = "passthrough"
+        elif scope["method"] == "OPTIONS":
+            request_type = "preflight"
+        else:
+            request_type = "simple"
+
+        snapshots = []
+
+        async def profiled_send(message):
+            if len(snapshots) == 1 and \
+                    message["type"] == "http.response.start":
+                snapshots.append(self.take_snapshot())
+            await send(message)
+
+        self.active = True
+        try:
+            snapshots.append(self.take_snapshot())
+            await middleware(scope, receive, profiled_send)
+        finally:
+            self.active = False
+        after = self.take_snapshot()
+
+        self.requests[request_type] += 1
+        before = snapshots[0]
+        if len(snapshots) > 1:
+            self.accumulate(self.live[request_type], snapshots[1], before)
+        self.accumulate(self.retained[request_type], after, before)
+
+    def accumulate(self, totals, snapshot, before) -> None:
+        for stat in snapshot.compare_to(before, "traceback"):
+            if not stat.size_diff and not stat.count_diff or \
+                    stat.traceback[-1].filename == __file__:
+                continue
+            path = self.code_path(stat.traceback)
+            entry = totals.setdefault(path, {"bytes": 0, "objects": 0})
+            entry["bytes"] += stat.size_diff
+            entry["objects"] += stat.count_diff
+
+    def code_path(self, traceback) -> str:
+        # frames go from the oldest to the most recent call.
+        for frame in reversed(traceback):
+            path = PATH_OF_FUNCTION.get(
+                self.function_name(frame.filename, frame.lineno)
+            )
+            if path is not None:
+                return path
+        return "__call__"
+
+    def function_name(
+            self, filename: str, lineno: int
+    ) -> typing.Optional[str]:
+        if not filename.startswith(PACKAGE_DIR):
+            return None
+        table = self.line_tables.get(filename)
+        if table is None:
+            table = self.line_tables[filename] = _line_table(filename)
+        for first, last, qualname in table:
+            if first <= lineno <= last:
+                return qualname
+        return None
+
+    def bytes_per_request(
+            self,
+            request_type: str,
+            kind: str = "live",
+            path: typing.Optional[str] = None,
+    ) -> float:
+        """
+        Average ``live`` or ``retained`` bytes per profiled request of
+        ``request_type``, for one code path or all of them. Handy to assert
+        allocation budgets in tests.
+        """
+        requests = self.requests[request_type]
+        if not requests:
+            return 0.0
+        totals = getattr(self, kind)[request_type]
+        if path is not None:
+            total = totals.get(path, {"bytes": 0})["bytes"]
+        else:
+            total = sum(entry["bytes"] for entry in totals.values())
+        return total / requests
+
+    def report(self) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        """
+        Returns the number of requests profiled and the ``live`` and
+        ``retained`` allocations by code path, for each request type.
+        """
+        return {
+            request_type: {
+                "requests": self.requests[request_type],
+                "live": dict(self.live[request_type]),
+                "retained": dict(self.retained[request_type]),
+            }
+            for request_type in REQUEST_TYPES
+        }
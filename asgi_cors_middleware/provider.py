@@ -0,0 +1,75 @@
+"""
+Dynamic origin lookups for origins that aren't part of the static policy.
+"""
+
+import time
+import typing
+
+from .cache import LRUCache
+
+OriginProvider = typing.Callable[[str], typing.Awaitable[bool]]
+
+
+class CachedOriginProvider:
+    """
+    Wraps an async ``provider(origin) -> bool`` with a TTL cache of positive
+    and negative answers.
+
+    Concurrent lookups of the same uncached origin share one in-flight call
+    to ``provider``. A provider that raises is logged and treated as a
+    denial, which is not cached.
+    """
+
+    def __init__(
+        self,
+        provider: OriginProvider,
+        ttl: float = 300.0,
+        negative_ttl: float = 30.0,
+        maxsize: int = 10000,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.provider = provider
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.cache = LRUCache(maxsize=maxsize)
+        self.inflight = {}
+        self.lookups = 0
+
+    async def __call__(self, origin: str) -> bool:
+        entry = self.cache.get(origin)
+        if entry is not None:
+            allowed, expires = entry
+            if self.clock() < expires:
+                return allowed
+
+        import asyncio
+
+        future = self.inflight.get(origin)
+        if future is None:
+            future = asyncio.ensure_future(self.lookup(origin))
+            self.inflight[origin] = future
+            future.add_done_callback(
+                lambda _: self.inflight.pop(origin, None)
+            )
+        # a cancelled request must not cancel the lookup other requests
+        #  are waiting on.
+        return await asyncio.shield(future)
+
+    async def lookup(self, origin: str) -> bool:
+        self.lookups += 1
+        try:
+            allowed = bool(await self.provider(origin))
+        except Exception:
+            import logging
+
+            logging.getLogger(__name__).exception(
+                "Origin provider failed for %r", origin
+            )
+            return False
+        ttl = self.ttl if allowed else self.negative_ttl
+        self.cache.set(origin, (allowed, self.clock() + ttl))
+        return allowed
+
+    def clear(self) -> None:
+        self.cache.clear()
@@ -0,0 +1,64 @@
+"""
+Path prefix dispatch of CORS policies.
+"""
+
+import typing
+
+from .policy import CorsPolicy
+
+
+class _Node:
+    __slots__ = ("children", "matched", "policy")
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.matched = False
+        self.policy = None
+
+
+def split_path(path: str) -> typing.List[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+class PolicyRouter:
+    """
+    Picks the policy of the longest matching path prefix using a trie of
+    path segments, so ``/api`` matches ``/api`` and ``/api/users`` but not
+    ``/apix``.
+
+    ``routes`` maps prefixes to policies; a ``None`` policy marks the prefix
+    as excluded from CORS handling altogether.
+    """
+
+    def __init__(
+        self, routes: typing.Mapping[str, typing.Optional[CorsPolicy]]
+    ) -> None:
+        self.root = _Node()
+        for prefix, policy in routes.items():
+            node = self.root
+            for segment in split_path(prefix):
+                child = node.children.get(segment)
+                if child is None:
+                    child = node.children[segment] = _Node()
+                node = child
+            node.matched = True
+            node.policy = policy
+
+    def lookup(
+        self, path: str, default: CorsPolicy
+    ) -> typing.Optional[CorsPolicy]:
+        """
+        Returns the policy for ``path``, ``default`` when no prefix matches,
+        or None when the path is excluded.
+        """
+        node = self.root
+        policy = node.policy if node.matched else default
+        for segment in path.split("/"):
+            if not segment:
+                continue
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.matched:
+                policy = node.policy
+        return policy
@@ -0,0 +1,115 @@
+"""
+Per-origin throttling of rejected preflight requests.
+"""
+
+import collections
+import math
+import time
+import typing
+
+THROTTLED_BODY = b"Too many disallowed CORS preflight requests"
+THROTTLE_STATUSES = (403, 429)
+
+
+class PreflightThrottle:
+    """
+    Token buckets, one per origin, charged for every preflight the
+    middleware rejects because of its origin. Each bucket holds up to ``burst`` tokens and refills
+    at ``rate`` tokens per second. While an origin's bucket is empty its
+    preflights are answered with a pre-rendered ``status`` (429 or 403)
+    response without being evaluated at all.
+
+    At most ``maxsize`` buckets are kept, least recently charged first out.
+    A bucket left alone long enough to refill completely is the same as no
+    bucket, so those are evicted as soon as they go stale.
+
+    Pass an instance as ``CorsASGIApp(preflight_throttle=...)``.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: int = 20,
+        maxsize: int = 10000,
+        status: int = 429,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate <= 0 or burst < 1 or maxsize <= 0:
+            raise ValueError("rate, burst and maxsize must be positive")
+        if status not in THROTTLE_STATUSES:
+            raise ValueError("status must be 403 or 429")
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.clock = clock
+        # time after which an idle bucket has refilled completely.
+        self.stale_after = burst / rate
+        self.throttled = 0
+        self.evictions = 0
+        # origin -> (tokens, last update), least recently charged first.
+        self.buckets = collections.OrderedDict()
+
+        headers = [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(THROTTLED_BODY)).encode()),
+        ]
+        if status == 429:
+            headers.append(
+                (b"retry-after", str(math.ceil(1 / rate)).encode())
+            )
+        self.headers = tuple(headers)
+        self.status = status
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+    def tokens(self, origin: bytes, now: float) -> float:
+        bucket = self.buckets.get(origin)
+        if bucket is None:
+            return self.burst
+        tokens, updated = bucket
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def blocked(self, origin: bytes) -> bool:
+        """
+        Whether preflights from ``origin`` are currently throttled.
+        """
+        if origin not in self.buckets:
+            return False
+        return self.tokens(origin, self.clock()) < 1
+
+    def charge(self, origin: bytes) -> None:
+        """
+        Takes a token from ``origin``'s bucket for a preflight rejected
+        because of its origin.
+        """
+        now = self.clock()
+        tokens = self.tokens(origin, now)
+        buckets = self.buckets
+        buckets.pop(origin, None)
+        self.evict_stale(now)
+        if len(buckets) >= self.maxsize:
+            buckets.popitem(last=False)
+            self.evictions += 1
+        buckets[origin] = (tokens - 1, now)
+
+    def evict_stale(self, now: float) -> None:
+        buckets = self.buckets
+        stale_before = now - self.stale_after
+        while buckets:
+            origin, (_, updated) = next(iter(buckets.items()))
+            if updated > stale_before:
+                return
+            del buckets[origin]
+
+    def clear(self) -> None:
+        self.buckets.clear()
+
+    async def send_throttled(self, send) -> None:
+        self.throttled += 1
+        await send({
+            "type": "http.response.start",
+            "status": self.status,
+            "headers": list(self.headers),
+        })
+        await send({"type": "http.response.body", "body": THROTTLED_BODY})
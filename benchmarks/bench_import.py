@@ -0,0 +1,79 @@
+"""
+Measures the time it takes a fresh interpreter to import the package.
+
+Each run starts ``python -X importtime -c "import asgi_cors_middleware"``
+and reads the cumulative time of the ``asgi_cors_middleware`` line, which
+covers the package and everything it imports; the median over the runs is
+reported. The script fails if importing
+the package loads a web framework or asyncio.
+
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --runs 20 --json results.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+FORBIDDEN_MODULES = ("asgiref", "asyncio", "starlette")
+CHECK_MODULES = (
+    "import sys, asgi_cors_middleware; "
+    "print(' '.join(m for m in {!r} if m in sys.modules))"
+)
+
+
+def import_time_us():
+    """
+    Returns the cumulative import time, in microseconds, of
+    ``asgi_cors_middleware`` and the modules it imports.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         "import asgi_cors_middleware"],
+        check=True, stderr=subprocess.PIPE, universal_newlines=True,
+    ).stderr
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # interpreter start-up imports (site, encodings, ...) are listed
+        #  at the same level; only the package's own line counts.
+        if name.strip() == "asgi_cors_middleware":
+            return int(cumulative)
+    raise RuntimeError("asgi_cors_middleware missing from -X importtime")
+
+
+def loaded_forbidden_modules():
+    output = subprocess.check_output([
+        sys.executable, "-c", CHECK_MODULES.format(FORBIDDEN_MODULES)
+    ], universal_newlines=True)
+    return output.split()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    times = [import_time_us() for _ in range(args.runs)]
+    result = {
+        "median_ms": round(statistics.median(times) / 1000, 2),
+        "min_ms": round(min(times) / 1000, 2),
+        "forbidden_modules": loaded_forbidden_modules(),
+    }
+    print("import asgi_cors_middleware: median {median_ms} ms, "
+          "min {min_ms} ms".format(**result))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if result["forbidden_modules"]:
+        sys.exit("importing the package loaded: {}".format(
+            ", ".join(result["forbidden_modules"])
+        ))
+
+
+if __name__ == "__main__":
+    main()
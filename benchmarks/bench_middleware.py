@@ -0,0 +1,271 @@
+"""
+Microbenchmarks for the CorsASGIApp hot paths.
+
+Every case drives the middleware's ``__call__`` directly with a synthetic
+scope, a no-op ``receive``/``send`` and a downstream app that answers
+without suspending, so the coroutine can be run to completion with
+``coro.send(None)`` and no event loop overhead is measured.
+
+For each case the script reports the best ns/op over several repeats, the
+bytes allocated per op (tracemalloc peak for a single call) and the number
+of memory blocks allocated per op: the ``sys.getallocatedblocks()`` delta
+between the start of a call and the moment the response starts, averaged
+over many calls with the garbage collector disabled. Each block is an
+object or buffer the middleware creates for the request, so it counts
+allocations where the peak only shows their size.
+Starlette's ``CORSMiddleware`` is run on the same cases as a baseline.
+
+    python -m benchmarks.bench_middleware
+    python -m benchmarks.bench_middleware --cache --json results.json
+"""
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from asgi_cors_middleware import CorsASGIApp
+
+REQUEST_METHOD = b"access-control-request-method"
+
+
+async def downstream_app(scope, receive, send):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/plain")],
+    })
+    await send({"type": "http.response.body", "body": b"OK"})
+
+
+async def receive():  # pragma: no cover - never awaited by these cases
+    return {"type": "http.request"}
+
+
+class RecordingSend:
+    __slots__ = ("status",)
+
+    def __init__(self):
+        self.status = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+
+
+def origins_list(size):
+    return ["https://tenant{}.example.com".format(i) for i in range(size)]
+
+
+def http_scope(method, headers):
+    return {
+        "type": "http",
+        "method": method,
+        "path": "/",
+        "headers": headers,
+    }
+
+
+def cases():
+    """
+    Yields ``(name, options, scope, expected_status)``. ``options`` use
+    CorsASGIApp's argument names.
+    """
+    base = {"origins": ["https://e.com", "https://e.org"]}
+    allowed = [(b"origin", b"https://e.com")]
+    disallowed = [(b"origin", b"https://evil.net")]
+
+    yield "no_origin", base, http_scope("GET", []), 200
+    yield "simple_allowed", base, http_scope("GET", allowed), 200
+    yield "simple_disallowed", base, http_scope("GET", disallowed), 200
+    yield (
+        "preflight_allowed", base,
+        http_scope("OPTIONS", allowed + [(REQUEST_METHOD, b"GET")]), 204,
+    )
+    yield (
+        "preflight_denied", base,
+        http_scope("OPTIONS", disallowed + [(REQUEST_METHOD, b"GET")]), 403,
+    )
+    yield (
+        "regex_allowed",
+        {"allow_origin_regex": r"https://.*\.example\.com"},
+        http_scope("GET", [(b"origin", b"https://a.example.com")]), 200,
+    )
+    for size in (1, 100, 10000):
+        origins = origins_list(size)
+        yield (
+            "origins_{}".format(size),
+            {"origins": origins},
+            http_scope("GET", [(b"origin", origins[-1].encode())]), 200,
+        )
+    for size in (1, 10000):
+        origins = [
+            "https://*.tenant{}.example.com".format(i) for i in range(size)
+        ]
+        origin = "https://app.tenant{}.example.com".format(size - 1)
+        yield (
+            "wildcard_origins_{}".format(size),
+            {"origins": origins},
+            http_scope("GET", [(b"origin", origin.encode())]), 200,
+        )
+
+
+def build_cors_app(options, cache):
+    if cache:
+        options = dict(
+            options, decision_cache_size=1024, preflight_cache_size=1024
+        )
+    return CorsASGIApp(app=downstream_app, **options)
+
+
+def build_starlette_app(options):
+    from starlette.middleware.cors import CORSMiddleware
+
+    return CORSMiddleware(
+        app=downstream_app,
+        allow_origins=options.get("origins", ()),
+        allow_origin_regex=options.get("allow_origin_regex"),
+    )
+
+
+def run_once(app, scope, send):
+    coro = app(scope, receive, send)
+    try:
+        coro.send(None)
+    except StopIteration:
+        return
+    coro.close()
+    raise RuntimeError("benchmark app suspended")
+
+
+def time_per_op(app, scope, number, repeat):
+    send = RecordingSend()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            run_once(app, scope, send)
+        elapsed = (time.perf_counter_ns() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bytes_per_op(app, scope):
+    send = RecordingSend()
+    # warm up caches and lazily created state before measuring
+    run_once(app, scope, send)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        run_once(app, scope, send)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - baseline
+
+
+class BlockCountingSend:
+    __slots__ = ("blocks",)
+
+    def __init__(self):
+        self.blocks = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.blocks = sys.getallocatedblocks()
+
+
+def blocks_per_op(app, scope, number):
+    send = BlockCountingSend()
+    # warm up caches and lazily created state before measuring
+    run_once(app, scope, send)
+    enabled = gc.isenabled()
+    gc.disable()
+    total = 0
+    try:
+        for _ in range(number):
+            before = sys.getallocatedblocks()
+            run_once(app, scope, send)
+            total += send.blocks - before
+    finally:
+        if enabled:
+            gc.enable()
+    return total / number
+
+
+def check_status(app, scope, expected):
+    send = RecordingSend()
+    run_once(app, scope, send)
+    if send.status is None or expected is not None and send.status != expected:
+        raise AssertionError(
+            "expected status {}, got {}".format(expected, send.status)
+        )
+
+
+def run(number, repeat, cache, baseline, only=None):
+    results = []
+    for name, options, scope, status in cases():
+        if only and name not in only:
+            continue
+        apps = [
+            ("asgi-cors-middleware", build_cors_app(options, cache), status)
+        ]
+        if baseline:
+            # starlette answers preflights with 200/400 rather than 204/403
+            apps.append(("starlette", build_starlette_app(options), None))
+        for implementation, app, expected_status in apps:
+            check_status(app, scope, expected_status)
+            results.append({
+                "case": name,
+                "implementation": implementation,
+                "ns_per_op": round(time_per_op(app, scope, number, repeat), 1),
+                "bytes_per_op": bytes_per_op(app, scope),
+                "blocks_per_op": round(blocks_per_op(app, scope, number), 1),
+            })
+    return results
+
+
+def print_table(results):
+    print("{:<20} {:<22} {:>12} {:>12} {:>10}".format(
+        "case", "implementation", "ns/op", "B/op", "blocks/op"
+    ))
+    for result in results:
+        print("{case:<20} {implementation:<22} {ns_per_op:>12.1f} "
+              "{bytes_per_op:>12} {blocks_per_op:>10.1f}".format(**result))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--cache", action="store_true",
+        help="enable the decision and preflight caches",
+    )
+    parser.add_argument(
+        "--no-baseline", action="store_true",
+        help="skip Starlette's CORSMiddleware",
+    )
+    parser.add_argument("--case", action="append", help="only run this case")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(
+        number=args.number,
+        repeat=args.repeat,
+        cache=args.cache,
+        baseline=not args.no_baseline,
+        only=args.case,
+    )
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+ASGI apps served by ``benchmarks.load_test``: the test app bare, wrapped
+in CorsASGIApp and wrapped in Starlette's CORSMiddleware, all allowing the
+same origins.
+"""
+
+from asgi_cors_middleware import CorsASGIApp
+from tests.asgi_app import app
+
+ORIGINS = ["https://e.com", "https://e.org"]
+
+bare = app
+cors = CorsASGIApp(app=app, origins=ORIGINS)
+
+
+def starlette():
+    from starlette.middleware.cors import CORSMiddleware
+
+    return CORSMiddleware(app=app, allow_origins=ORIGINS)
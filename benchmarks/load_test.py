@@ -0,0 +1,231 @@
+"""
+End-to-end load test of the middleware under a real server.
+
+For each implementation (the bare test app, CorsASGIApp and Starlette's
+CORSMiddleware, see ``benchmarks.load_apps``) a uvicorn process is started
+and driven with a mix of no-origin, simple, preflight and denied requests
+over keep-alive connections by the small HTTP/1.1 client below. Requests
+per second, latency percentiles and status counts are reported and can be
+written out as JSON to track regressions.
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --duration 10 --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+# implementation name -> (uvicorn app, whether it is an app factory)
+IMPLEMENTATIONS = {
+    "bare": ("benchmarks.load_apps:bare", False),
+    "asgi-cors-middleware": ("benchmarks.load_apps:cors", False),
+    "starlette": ("benchmarks.load_apps:starlette", True),
+}
+# (name, weight, method, extra headers)
+TRAFFIC = (
+    ("no_origin", 4, "GET", ()),
+    ("simple", 4, "GET", (("Origin", "https://e.com"),)),
+    ("preflight", 1, "OPTIONS", (
+        ("Origin", "https://e.com"),
+        ("Access-Control-Request-Method", "GET"),
+    )),
+    ("denied", 1, "GET", (("Origin", "https://evil.net"),)),
+)
+NO_BODY_STATUSES = (204, 304)
+
+
+def encode_request(method, headers, host):
+    lines = ["{} / HTTP/1.1".format(method), "Host: {}".format(host)]
+    lines += ["{}: {}".format(key, value) for key, value in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def request_schedule(host, seed):
+    """
+    Returns a list of ``(kind, raw_request)`` following the TRAFFIC weights,
+    shuffled so every connection sees the same mix.
+    """
+    schedule = []
+    for kind, weight, method, headers in TRAFFIC:
+        schedule += [(kind, encode_request(method, headers, host))] * weight
+    random.Random(seed).shuffle(schedule)
+    return schedule
+
+
+async def read_response(reader):
+    """
+    Reads one HTTP/1.1 response and returns its status code.
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, _, header_block = head.partition(b"\r\n")
+    status = int(status_line.split(b" ", 2)[1])
+    length = None
+    chunked = False
+    for line in header_block.split(b"\r\n"):
+        key, _, value = line.partition(b":")
+        key = key.strip().lower()
+        if key == b"content-length":
+            length = int(value)
+        elif key == b"transfer-encoding":
+            chunked = b"chunked" in value.lower()
+    if status in NO_BODY_STATUSES:
+        return status
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                return status
+    if length:
+        await reader.readexactly(length)
+    return status
+
+
+async def connection_worker(host, port, deadline, seed, results):
+    reader, writer = await asyncio.open_connection(host, port)
+    schedule = request_schedule("{}:{}".format(host, port), seed)
+    latencies = results["latencies"]
+    statuses = results["statuses"]
+    clock = time.perf_counter
+    try:
+        index = 0
+        while clock() < deadline:
+            kind, raw_request = schedule[index % len(schedule)]
+            index += 1
+            started = clock()
+            writer.write(raw_request)
+            status = await read_response(reader)
+            latencies.append(clock() - started)
+            key = "{} {}".format(kind, status)
+            statuses[key] = statuses.get(key, 0) + 1
+    finally:
+        writer.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+async def drive(host, port, duration, concurrency):
+    results = {"latencies": [], "statuses": {}}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        connection_worker(host, port, deadline, seed, results)
+        for seed in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(results["latencies"])
+    return {
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "statuses": dict(sorted(results["statuses"].items())),
+    }
+
+
+def free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(host, port, process, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(
+                "server exited with {}".format(process.returncode)
+            )
+        try:
+            socket.create_connection((host, port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("server didn't start listening on port {}".format(port))
+
+
+def start_server(target, factory, host, port):
+    command = [
+        sys.executable, "-m", "uvicorn", target,
+        "--host", host, "--port", str(port),
+        "--log-level", "warning", "--no-access-log",
+    ]
+    if factory:
+        command.append("--factory")
+    process = subprocess.Popen(command, cwd=os.getcwd())
+    wait_for_port(host, port, process)
+    return process
+
+
+def run(implementations, duration, concurrency, host="127.0.0.1"):
+    results = []
+    for name in implementations:
+        port = free_port(host)
+        target, factory = IMPLEMENTATIONS[name]
+        process = start_server(target, factory, host, port)
+        try:
+            # short warm-up so imports and caches don't count
+            asyncio.run(drive(host, port, min(1.0, duration), concurrency))
+            result = asyncio.run(drive(host, port, duration, concurrency))
+        finally:
+            process.terminate()
+            process.wait()
+        results.append(dict(implementation=name, **result))
+    return results
+
+
+def print_table(results):
+    print("{:<22} {:>10} {:>10} {:>10}".format(
+        "implementation", "req/s", "p50 ms", "p99 ms"
+    ))
+    for result in results:
+        print("{implementation:<22} {requests_per_second:>10.1f} "
+              "{p50_ms:>10.3f} {p99_ms:>10.3f}".format(**result))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--implementation", action="append", choices=sorted(IMPLEMENTATIONS),
+        help="only run this implementation",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(
+        args.implementation or list(IMPLEMENTATIONS),
+        duration=args.duration,
+        concurrency=args.concurrency,
+    )
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "duration": args.duration,
+                    "concurrency": args.concurrency,
+                    "traffic": {
+                        kind: weight for kind, weight, _, _ in TRAFFIC
+                    },
+                    "results": results,
+                },
+                f, indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
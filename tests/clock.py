@@ -0,0 +1,13 @@
+class FakeClock:
+    """
+    Settable clock for tests: returns ``now``, advanced by ``step`` on each
+    call.
+    """
+
+    def __init__(self, step=0.0):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
@@ -0,0 +1,51 @@
+import pytest
+
+from asgi_cors_middleware.cache import LRUCache
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.info() == {
+        "hits": 2, "misses": 1, "evictions": 1, "size": 2, "maxsize": 2,
+    }
+
+
+def test_fifo_eviction():
+    cache = LRUCache(maxsize=2, eviction="fifo")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "a" not in cache
+    assert "b" in cache
+
+
+def test_clear():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_items_in_recency_order():
+    cache = LRUCache(maxsize=3)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    assert cache.items() == [("b", 2), ("a", 1)]
+    assert cache.info()["hits"] == 1
+
+
+@pytest.mark.parametrize(
+    "options", [{"maxsize": 0}, {"eviction": "random"}],
+)
+def test_invalid_options(options):
+    with pytest.raises(ValueError):
+        LRUCache(**options)
@@ -0,0 +1,154 @@
+import json
+import os
+import time
+
+import pytest
+
+from asgi_cors_middleware import CorsASGIApp
+from asgi_cors_middleware.decision_log import DecisionLog
+from .asgi_app import app
+from .test_middleware import REQUEST_HEADERS, REQUEST_METHOD
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / "decisions.jsonl"
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def make_log(path, **kwargs):
+    kwargs.setdefault("sample_rate", 1.0)
+    kwargs.setdefault("clock", lambda: 1.5)
+    return DecisionLog(str(path), **kwargs)
+
+
+async def receive():
+    return {"type": "http.request"}
+
+
+async def send(message):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_denied_decisions_are_written(log_path):
+    log = make_log(log_path)
+    cors_app = CorsASGIApp(
+        app=app, origins=["http://e.com"], decision_log=log,
+    )
+    for method, headers in (
+        ("GET", [(b"origin", b"http://e.com")]),
+        ("GET", [(b"origin", b"http://evil.net")]),
+        ("OPTIONS", [
+            (b"origin", b"http://e.com"),
+            (REQUEST_METHOD, b"PUT"),
+            (REQUEST_HEADERS, b"x-token"),
+        ]),
+    ):
+        await cors_app(
+            {"type": "http", "method": method, "path": "/",
+             "headers": headers},
+            receive, send,
+        )
+    log.close()
+
+    assert read_records(log_path) == [
+        {
+            "time": 1.5, "kind": "simple", "path": "/",
+            "origin": "http://evil.net", "requested_method": None,
+            "requested_headers": None, "allowed": False,
+            "reasons": ["origin"],
+        },
+        {
+            "time": 1.5, "kind": "preflight", "path": "/",
+            "origin": "http://e.com", "requested_method": "PUT",
+            "requested_headers": "x-token", "allowed": False,
+            "reasons": ["method", "headers"],
+        },
+    ]
+    assert log.written == 2
+
+
+def test_sampling_and_allowed_records(log_path):
+    samples = iter([0.2, 0.7, 0.4])
+    log = make_log(
+        log_path, sample_rate=0.5, include_allowed=True,
+        random=lambda: next(samples),
+    )
+    for origin in (b"http://a.com", b"http://b.com", b"http://c.com"):
+        log.record("simple", {"path": "/"}, origin, True)
+    log.close()
+    assert [record["origin"] for record in read_records(log_path)] == [
+        "http://a.com", "http://c.com",
+    ]
+
+
+def test_full_queue_drops_records(log_path):
+    log = make_log(log_path, queue_size=2, flush_interval=60)
+    for _ in range(5):
+        log.record("simple", {"path": "/"}, b"http://evil.net", False)
+    assert log.dropped == 3
+    log.close()
+    assert log.written == 2
+    assert len(read_records(log_path)) == 2
+    log.record("simple", {"path": "/"}, b"http://evil.net", False)
+    assert log.dropped == 4
+
+
+def test_write_errors_drop_the_batch(tmp_path):
+    log_path = tmp_path / "missing" / "decisions.jsonl"
+    log = make_log(log_path, batch_size=2, flush_interval=60)
+    for _ in range(2):
+        log.record("simple", {"path": "/"}, b"http://evil.net", False)
+    for _ in range(100):
+        if log.write_errors:
+            break
+        time.sleep(0.01)
+    assert log.write_errors == 1
+    assert log.dropped == 2
+    assert log.thread.is_alive()
+
+    log_path.parent.mkdir()
+    log.record("simple", {"path": "/"}, b"http://evil.net", False)
+    log.close()
+    assert log.written == 1
+    assert len(read_records(log_path)) == 1
+
+
+def test_close_does_not_raise_on_write_errors(tmp_path):
+    log = make_log(tmp_path / "missing" / "decisions.jsonl", flush_interval=60)
+    log.record("simple", {"path": "/"}, b"http://evil.net", False)
+    log.close()
+    assert log.write_errors == 1
+    assert log.dropped == 1
+    assert log.written == 0
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_process_starts_its_own_writer(log_path):
+    log = make_log(log_path, flush_interval=60)
+    log.record("simple", {"path": "/parent"}, b"http://evil.net", False)
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover - runs in the child
+        status = 1
+        try:
+            log.record("simple", {"path": "/child"}, b"http://evil.net", False)
+            alive = log.thread.is_alive()
+            log.close()
+            status = 0 if alive and log.written == 1 else 1
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    log.close()
+    assert sorted(record["path"] for record in read_records(log_path)) == [
+        "/child", "/parent",
+    ]
+
+
+def test_invalid_sample_rate(log_path):
+    with pytest.raises(ValueError):
+        DecisionLog(str(log_path), sample_rate=2)
@@ -0,0 +1,86 @@
+import pytest
+
+from asgi_cors_middleware.headers import (
+    rewrite_response_headers, scan_request_headers, validate_request_headers,
+)
+
+
+def test_scan_request_headers():
+    assert scan_request_headers(
+        [
+            (b"host", b"e.net"),
+            (b"origin", b"http://e.com"),
+            (b"origin", b"http://e.org"),
+            (b"cookie", b"session=1234"),
+            (b"access-control-request-method", b"PATCH"),
+            (b"access-control-request-headers", b"x-token"),
+        ]
+    ) == (b"http://e.com", True, b"PATCH", b"x-token")
+
+
+def test_scan_request_headers_without_cors_headers():
+    assert scan_request_headers([(b"host", b"e.net")]) == (
+        None, False, None, None
+    )
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (b"x-token", True),
+        (b"X-Token, content-type", True),
+        (b" x-token ,, x-trace ,", True),
+        (b"", True),
+        (b"x-token, x-other", False),
+        (b"x-token" + b", x-token" * 3, False),
+        (b"x-token," + b" " * 40, False),
+    ],
+)
+def test_validate_request_headers(value, expected):
+    allowed = frozenset((b"x-token", b"x-trace", b"content-type"))
+    assert validate_request_headers(
+        value, allowed, max_count=3, max_length=32
+    ) is expected
+
+
+def test_validate_request_headers_allowing_any_name():
+    assert validate_request_headers(b"x-a, x-b", None)
+    assert not validate_request_headers(b"x-a, x-b", None, max_count=1)
+
+
+CORS_HEADERS = (
+    (b"access-control-allow-origin", b"http://e.com"),
+    (b"access-control-allow-credentials", b"true"),
+)
+
+
+def test_rewrite_response_headers_replaces_app_cors_headers():
+    app_headers = (
+        (b"content-type", b"text/plain"),
+        (b"access-control-allow-origin", b"*"),
+        (b"access-control-max-age", b"10"),
+        (b"vary", b"Accept"),
+        (b"vary", b"Cookie"),
+    )
+    assert rewrite_response_headers(app_headers, CORS_HEADERS, True) == [
+        (b"content-type", b"text/plain"),
+        (b"access-control-max-age", b"10"),
+        (b"vary", b"Accept, Origin"),
+        (b"vary", b"Cookie"),
+    ] + list(CORS_HEADERS)
+
+
+@pytest.mark.parametrize(
+    "app_headers, vary, expected",
+    [
+        ((), True, [(b"vary", b"Origin")]),
+        ((), False, []),
+        ([(b"vary", b"*")], True, [(b"vary", b"*")]),
+        ([(b"vary", b"origin")], True, [(b"vary", b"origin")]),
+        ([(b"vary", b"Accept")], False, [(b"vary", b"Accept")]),
+    ],
+)
+def test_rewrite_response_headers_vary(app_headers, vary, expected):
+    rewritten = rewrite_response_headers(app_headers, (), vary)
+    assert rewritten == expected
+    assert rewritten is not app_headers
@@ -0,0 +1,53 @@
+import subprocess
+import sys
+
+import pytest
+
+from asgi_cors_middleware.compat import (
+    guarantee_single_callable, is_double_callable,
+)
+from .asgi_app import app
+
+
+def test_import_loads_no_framework_or_event_loop():
+    code = (
+        "import sys, asgi_cors_middleware; "
+        "print(' '.join(sorted(m for m in ('asyncio', 'asgiref', 'starlette', "
+        "'inspect', 'json', 'logging', 'threading', 'random', "
+        "'asgi_cors_middleware.decision_log') if m in sys.modules)))"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code])
+    assert output.strip() == b""
+
+
+class DoubleCallableApp:
+    def __init__(self, scope):
+        self.scope = scope
+
+    async def __call__(self, receive, send):
+        await send({"type": "http.response.start", "status": 200})
+
+
+class SingleCallableApp:
+    async def __call__(self, scope, receive, send):
+        pass
+
+
+def test_is_double_callable():
+    assert is_double_callable(DoubleCallableApp)
+    assert is_double_callable(lambda scope: None)
+    assert not is_double_callable(app)
+    assert not is_double_callable(SingleCallableApp())
+
+
+@pytest.mark.asyncio
+async def test_guarantee_single_callable_wraps_asgi2_apps():
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    wrapped = guarantee_single_callable(DoubleCallableApp)
+    await wrapped({"type": "http"}, None, send)
+    assert messages == [{"type": "http.response.start", "status": 200}]
+    assert guarantee_single_callable(app) is app
@@ -0,0 +1,162 @@
+import pytest
+
+from asgi_cors_middleware import CorsASGIApp, CorsMetrics
+from .asgi_app import app
+from .clock import FakeClock
+from .test_middleware import ALLOW_ORIGIN, REQUEST_METHOD, do_cors_response
+
+
+def test_observe_buckets():
+    metrics = CorsMetrics(buckets=(0.001, 0.01))
+    metrics.observe("passthrough", 0.0005)
+    metrics.observe("passthrough", 0.005)
+    metrics.observe("passthrough", 1.0)
+    assert metrics.requests["passthrough"] == 3
+    assert metrics.bucket_counts["passthrough"] == [1, 1]
+
+    text = metrics.render_prometheus()
+    assert 'cors_requests_total{outcome="passthrough"} 3' in text
+    assert 'cors_middleware_seconds_bucket{outcome="passthrough",le="0.001"} 1' in text
+    assert 'cors_middleware_seconds_bucket{outcome="passthrough",le="0.01"} 2' in text
+    assert 'cors_middleware_seconds_bucket{outcome="passthrough",le="+Inf"} 3' in text
+    assert 'cors_middleware_seconds_count{outcome="passthrough"} 3' in text
+    assert "# TYPE cors_middleware_seconds histogram" in text
+
+
+def test_observe_preflight_reasons():
+    metrics = CorsMetrics()
+    metrics.observe("preflight_204", 0.0)
+    metrics.observe("preflight_403", 0.0, ("origin", "method"))
+    assert metrics.requests["preflight_204"] == 1
+    assert metrics.requests["preflight_403"] == 1
+    assert metrics.preflight_failures == {
+        "origin": 1, "method": 1, "headers": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_middleware_records_outcomes():
+    metrics = CorsMetrics(clock=FakeClock(step=0.000001))
+    cors_app = CorsASGIApp(
+        app=app,
+        origins=["http://e.com"],
+        allow_origin_regex=r"http://.*\.e\.org",
+        metrics=metrics,
+    )
+    json_headers = [
+        (b"content-length", b"17"),
+        (b"content-type", b"application/json"),
+    ]
+    hello = b'{"hello":"world"}'
+
+    await do_cors_response(
+        scope={"method": "GET", "headers": []},
+        expected_output={"status": 200, "headers": json_headers, "body": hello},
+        cors_app=cors_app,
+    )
+    await do_cors_response(
+        scope={"method": "GET", "headers": [(b"origin", b"http://e.com")]},
+        expected_output={
+            "status": 200,
+            "headers": json_headers + [
+                (ALLOW_ORIGIN, b"http://e.com"), (b"vary", b"Origin"),
+            ],
+            "body": hello,
+        },
+        cors_app=cors_app,
+    )
+    await do_cors_response(
+        scope={"method": "GET", "headers": [(b"origin", b"http://e.net")]},
+        expected_output={"status": 200, "headers": json_headers, "body": hello},
+        cors_app=cors_app,
+    )
+    await do_cors_response(
+        scope={
+            "method": "OPTIONS",
+            "headers": [(b"origin", b"http://e.net"), (REQUEST_METHOD, b"PUT")],
+        },
+        expected_output={
+            "status": 403,
+            "headers": [
+                (b"access-control-allow-methods", b"GET"),
+                (b"access-control-max-age", b"600"),
+                (b"vary", b"Origin"),
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", b"30"),
+            ],
+            "body": b"Disallowed CORS origin, method",
+        },
+        cors_app=cors_app,
+    )
+
+    assert metrics.requests == {
+        "passthrough": 1,
+        "simple_allowed": 1,
+        "simple_denied": 1,
+        "simple_rejected": 0,
+        "preflight_204": 0,
+        "preflight_403": 1,
+        "preflight_throttled": 0,
+    }
+    assert metrics.preflight_failures["origin"] == 1
+    assert metrics.preflight_failures["method"] == 1
+    assert metrics.regex_evaluations == 2
+    assert all(duration > 0 for outcome, duration in metrics.durations.items()
+               if metrics.requests[outcome])
+
+
+@pytest.mark.asyncio
+async def test_preflight_ratios_by_origin():
+    metrics = CorsMetrics(track_origins=2)
+    cors_app = CorsASGIApp(
+        app=app, origins=["http://e.com", "http://e.org", "http://e.net"],
+        metrics=metrics,
+    )
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    requests = [
+        ("OPTIONS", b"http://e.com"), ("OPTIONS", b"http://e.com"),
+        ("GET", b"http://e.com"), ("GET", b"http://e.org"),
+        ("OPTIONS", b"http://evil.net"),
+    ]
+    for method, origin in requests:
+        headers = [(b"origin", origin)]
+        if method == "OPTIONS":
+            headers.append((REQUEST_METHOD, b"GET"))
+        await cors_app(
+            {"type": "http", "method": method, "path": "/",
+             "headers": headers},
+            receive, send,
+        )
+
+    assert metrics.preflight_ratios() == [
+        {"origin": "http://e.com", "preflights": 2, "simple": 1,
+         "ratio": 2.0},
+        {"origin": "http://e.org", "preflights": 0, "simple": 1,
+         "ratio": 0.0},
+    ]
+    text = metrics.render_prometheus()
+    assert 'cors_origin_requests_total{origin="http://e.com",' \
+        'kind="preflights"} 2' in text
+
+    # the least recently seen origin is dropped past track_origins
+    await cors_app(
+        {"type": "http", "method": "GET", "path": "/",
+         "headers": [(b"origin", b"http://e.net")]},
+        receive, send,
+    )
+    assert [entry["origin"] for entry in metrics.preflight_ratios()] == [
+        "http://e.org", "http://e.net",
+    ]
+
+
+def test_origins_not_tracked_by_default():
+    metrics = CorsMetrics()
+    assert metrics.origins is None
+    assert metrics.preflight_ratios() == []
+    assert "origin_requests_total" not in metrics.render_prometheus()
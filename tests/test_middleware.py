@@ -2,7 +2,7 @@ import pytest
 from asgiref.testing import ApplicationCommunicator as HttpCommunicator
 from channels.testing import WebsocketCommunicator
 
-from asgi_cors_middleware.middleware import CorsASGIApp
+from asgi_cors_middleware.middleware import CorsASGIApp, SimpleResponseSend
 from .asgi_app import app
 from .asgi_app import ASGI2app
 
@@ -21,7 +21,7 @@ async def do_cors_response(scope, expected_output, cors_options=None, cors_app=N
             cors_options = {}
         cors_app = CorsASGIApp(app=app, **cors_options)
     scope["type"] = "http"
-    scope["path"] = "/"
+    scope.setdefault("path", "/")
     communicator = HttpCommunicator(
         scope=scope,
         application=cors_app,
@@ -66,6 +66,30 @@ class TestOrigins:
                 ["http://e.net"],
                 [(ALLOW_ORIGIN, b"http://e.net")],
             ),
+            (
+                [(b"origin", b"https://a.e.net")],
+                ["https://*.e.net"],
+                [
+                    (ALLOW_ORIGIN, b"https://a.e.net"),
+                    (b"vary", b"Origin"),
+                ],
+            ),
+            (
+                [(b"origin", b"capacitor://localhost")],
+                ["capacitor://localhost", "chrome-extension://abcdefgh"],
+                [
+                    (ALLOW_ORIGIN, b"capacitor://localhost"),
+                    (b"vary", b"Origin"),
+                ],
+            ),
+            (
+                [(b"origin", b"null")],
+                ["null", "http://e.net"],
+                [
+                    (ALLOW_ORIGIN, b"null"),
+                    (b"vary", b"Origin"),
+                ],
+            ),
             (
                 [(b"origin", b"http://e.com")],
                 ["http://e.edu", "http://e.org"],
@@ -76,14 +100,23 @@ class TestOrigins:
                 ["http://e.net"],
                 [],
             ),
+            (
+                [(b"origin", b"null")],
+                ["http://e.net"],
+                [],
+            ),
         ],
         ids=[
             "wildcard",
             "wildcard_cookies",
             "multiple",
             "single",
+            "subdomain_wildcard",
+            "custom_scheme",
+            "null",
             "disallowed_multiple",
             "disallowed_single",
+            "disallowed_null",
         ],
     )
     async def test_simple_response(
@@ -128,6 +161,18 @@ class TestOrigins:
                 204,
                 b"",
             ),
+            (
+                b"https://a.e.net",
+                ["https://*.e.net"],
+                [
+                    (ALLOW_METHODS, b"GET"),
+                    (MAX_AGE, b"600"),
+                    (ALLOW_ORIGIN, b"https://a.e.net"),
+                    (b"vary", b"Origin"),
+                ],
+                204,
+                b"",
+            ),
             (
                 b"http://e.net",
                 ["http://e.net"],
@@ -168,6 +213,7 @@ class TestOrigins:
         ids=[
             "wildcard",
             "multiple",
+            "subdomain_wildcard",
             "single",
             "disallowed_multiple",
             "disallowed_single",
@@ -612,6 +658,32 @@ class TestAllowHeaders:
                 b"Disallowed CORS headers",
                 ["X-Header1"],
             ),
+            (
+                [(REQUEST_HEADERS, b"Content-Type")],
+                403,
+                [
+                    (ALLOW_METHODS, b"GET"),
+                    (ALLOW_ORIGIN, b"http://e.com"),
+                    (MAX_AGE, b"600"),
+                    (ALLOW_HEADERS, b"X-Header1"),
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", b"23"),
+                ],
+                b"Disallowed CORS headers",
+                ["X-Header1"],
+            ),
+            (
+                [(REQUEST_HEADERS, b"X-Header1, Content-Type")],
+                204,
+                [
+                    (ALLOW_METHODS, b"GET"),
+                    (ALLOW_ORIGIN, b"http://e.com"),
+                    (MAX_AGE, b"600"),
+                    (ALLOW_HEADERS, b"Content-Type, X-Header1"),
+                ],
+                b"",
+                ["X-Header1", "Content-Type"],
+            ),
         ],
         ids=[
             "wildcard",
@@ -622,6 +694,8 @@ class TestAllowHeaders:
             "requested_single",
             "disallowed_multiple",
             "disallowed_single",
+            "unlisted_safelisted",
+            "listed_safelisted",
         ],
     )
     async def test_preflight_response(
@@ -825,3 +899,348 @@ class TestASGI2:
             assert response == {"hello": "world"}
         finally:
             await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+class TestOriginMatching:
+    async def test_exact_origin_matching(self):
+        cors_app = CorsASGIApp(app=app, origins=["http://e.com"])
+        assert cors_app.is_allowed_origin("http://e.com")
+        assert not cors_app.is_allowed_origin("http://e.com.evil.net")
+
+    async def test_legacy_origin_matching(self):
+        cors_app = CorsASGIApp(
+            app=app, origins=["e.com"], legacy_origin_matching=True
+        )
+        assert cors_app.is_allowed_origin("http://e.com.evil.net")
+        await do_cors_response(
+            scope={
+                "method": "GET",
+                "headers": [(b"origin", b"http://e.com.evil.net")],
+            },
+            expected_output={
+                "status": 200,
+                "headers": [
+                    (ALLOW_ORIGIN, b"http://e.com.evil.net"),
+                    (b"content-length", b"17"),
+                    (b"content-type", b"application/json"),
+                ],
+                "body": b'{"hello":"world"}',
+            },
+            cors_app=cors_app,
+        )
+
+
+@pytest.mark.asyncio
+class TestDecisionCache:
+    async def test_decisions_are_cached(self):
+        cors_app = CorsASGIApp(
+            app=app,
+            origins=["http://e.com"],
+            allow_origin_regex=r"http://e\..*",
+            decision_cache_size=1,
+        )
+        for origin in (b"http://e.com", b"http://e.com", b"http://e.org"):
+            await do_cors_response(
+                scope={"method": "GET", "headers": [(b"origin", origin)]},
+                expected_output={
+                    "status": 200,
+                    "headers": [
+                        (ALLOW_ORIGIN, origin),
+                        (b"vary", b"Origin"),
+                        (b"content-length", b"17"),
+                        (b"content-type", b"application/json"),
+                    ],
+                    "body": b'{"hello":"world"}',
+                },
+                cors_app=cors_app,
+            )
+        assert cors_app.decision_cache.info() == {
+            "hits": 1, "misses": 2, "evictions": 1, "size": 1, "maxsize": 1,
+        }
+
+    async def test_cache_disabled_by_default(self):
+        assert CorsASGIApp(app=app).decision_cache is None
+
+
+@pytest.mark.asyncio
+async def test_simple_response_send_wrapper():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    cors_app = CorsASGIApp(app=app, origins=["http://e.com", "http://e.org"])
+    _, headers = cors_app.origin_decision(b"http://e.com")
+    wrapper = SimpleResponseSend(send, headers, vary=True)
+    await wrapper({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": ((b"vary", b"Accept"),),
+    })
+    await wrapper({"type": "http.response.body", "body": b""})
+    assert sent[0]["headers"] == [
+        (b"vary", b"Accept, Origin"),
+        (ALLOW_ORIGIN, b"http://e.com"),
+    ]
+    assert sent[1] == {"type": "http.response.body", "body": b""}
+
+
+@pytest.mark.asyncio
+class TestPreflightCache:
+    async def test_preflight_responses_are_cached(self):
+        cors_app = CorsASGIApp(
+            app=app, origins=["http://e.com"], preflight_cache_size=8
+        )
+        for _ in range(2):
+            await do_cors_response(
+                scope={
+                    "method": "OPTIONS",
+                    "headers": [
+                        (b"origin", b"http://e.com"),
+                        (REQUEST_METHOD, b"GET"),
+                    ],
+                },
+                expected_output={
+                    "status": 204,
+                    "headers": [
+                        (ALLOW_ORIGIN, b"http://e.com"),
+                        (ALLOW_METHODS, b"GET"),
+                        (MAX_AGE, b"600"),
+                    ],
+                    "body": b"",
+                },
+                cors_app=cors_app,
+            )
+        for _ in range(2):
+            await do_cors_response(
+                scope={
+                    "method": "OPTIONS",
+                    "headers": [
+                        (b"origin", b"http://e.com"),
+                        (REQUEST_METHOD, b"DELETE"),
+                    ],
+                },
+                expected_output={
+                    "status": 403,
+                    "headers": [
+                        (ALLOW_ORIGIN, b"http://e.com"),
+                        (ALLOW_METHODS, b"GET"),
+                        (MAX_AGE, b"600"),
+                        (b"content-type", b"text/plain; charset=utf-8"),
+                        (b"content-length", b"22"),
+                    ],
+                    "body": b"Disallowed CORS method",
+                },
+                cors_app=cors_app,
+            )
+        info = cors_app.preflight_cache.info()
+        assert (info["hits"], info["misses"], info["size"]) == (2, 2, 2)
+
+        cors_app.clear_caches()
+        assert len(cors_app.preflight_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_preflight_response_with_multiple_origin_regexes():
+    await do_cors_response(
+        scope={
+            "method": "OPTIONS",
+            "headers": [
+                (b"origin", b"https://a.e.org"),
+                (REQUEST_METHOD, b"GET"),
+            ],
+        },
+        expected_output={
+            "status": 204,
+            "headers": [
+                (ALLOW_ORIGIN, b"https://a.e.org"),
+                (ALLOW_METHODS, b"GET"),
+                (MAX_AGE, b"600"),
+                (b"vary", b"Origin"),
+            ],
+            "body": b"",
+        },
+        cors_options={
+            "allow_origin_regex": [r"https://.*\.e\.com", r"https://.*\.e\.org"],
+        },
+    )
+
+
+@pytest.mark.asyncio
+class TestWebsocketOrigin:
+    async def connect(self, cors_app, headers):
+        communicator = WebsocketCommunicator(
+            application=cors_app, path="/", headers=headers
+        )
+        try:
+            return await communicator.connect()
+        finally:
+            await communicator.disconnect()
+
+    async def test_disallowed_origin_is_closed(self):
+        cors_app = CorsASGIApp(
+            app=app, origins=["http://e.com"], enforce_websocket_origin=True
+        )
+        connected, code = await self.connect(
+            cors_app, [(b"origin", b"http://evil.net")]
+        )
+        assert not connected
+        assert code == 1008
+
+    @pytest.mark.parametrize(
+        "headers", [[(b"origin", b"http://e.com")], []],
+        ids=["allowed", "no_origin"],
+    )
+    async def test_allowed_handshake(self, headers):
+        cors_app = CorsASGIApp(
+            app=app, origins=["http://e.com"], enforce_websocket_origin=True
+        )
+        connected, _ = await self.connect(cors_app, headers)
+        assert connected
+
+    async def test_not_enforced_by_default(self):
+        cors_app = CorsASGIApp(app=app, origins=["http://e.com"])
+        connected, _ = await self.connect(
+            cors_app, [(b"origin", b"http://evil.net")]
+        )
+        assert connected
+
+
+@pytest.mark.asyncio
+class TestRejectDisallowedSimple:
+    hello = {
+        "status": 200,
+        "headers": [
+            (b"content-length", b"17"),
+            (b"content-type", b"application/json"),
+        ],
+        "body": b'{"hello":"world"}',
+    }
+    rejected = {
+        "status": 403,
+        "headers": [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", b"22"),
+        ],
+        "body": b"Disallowed CORS origin",
+    }
+
+    @pytest.mark.parametrize(
+        "options, method, path, rejected",
+        [
+            ({}, "GET", "/", False),
+            ({"reject_disallowed_simple": True}, "GET", "/", True),
+            (
+                {"reject_disallowed_simple": True,
+                 "reject_unsafe_methods_only": True},
+                "GET", "/", False,
+            ),
+            (
+                {"reject_disallowed_simple": True,
+                 "reject_unsafe_methods_only": True},
+                "POST", "/", True,
+            ),
+            (
+                {"reject_disallowed_simple": True, "reject_paths": ["/api/"]},
+                "GET", "/api/users", True,
+            ),
+            (
+                {"reject_disallowed_simple": True, "reject_paths": ["/api"]},
+                "GET", "/", False,
+            ),
+        ],
+        ids=[
+            "disabled",
+            "enabled",
+            "safe_method",
+            "unsafe_method",
+            "matching_path",
+            "other_path",
+        ],
+    )
+    async def test_disallowed_origin(self, options, method, path, rejected):
+        calls = []
+
+        async def recording_app(scope, receive, send):
+            calls.append(scope)
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-length", b"17"),
+                    (b"content-type", b"application/json"),
+                ],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": b'{"hello":"world"}',
+            })
+
+        await do_cors_response(
+            scope={
+                "method": method,
+                "path": path,
+                "headers": [(b"origin", b"http://evil.net")],
+            },
+            expected_output=self.rejected if rejected else self.hello,
+            cors_app=CorsASGIApp(
+                app=recording_app, origins=["http://e.com"], **options
+            ),
+        )
+        assert len(calls) == (0 if rejected else 1)
+
+    async def test_allowed_origin_reaches_app(self):
+        await do_cors_response(
+            scope={"method": "GET", "headers": [(b"origin", b"http://e.com")]},
+            expected_output={
+                "status": 200,
+                "headers": self.hello["headers"] + [
+                    (ALLOW_ORIGIN, b"http://e.com"),
+                ],
+                "body": self.hello["body"],
+            },
+            cors_options={
+                "origins": ["http://e.com"], "reject_disallowed_simple": True,
+            },
+        )
+
+
+@pytest.mark.parametrize(
+    "requested_headers, status",
+    [
+        (b"X-Token", 204),
+        (b"Content-Type", 403),
+        (b"X-Token, Accept", 403),
+        (b"X-Token, X-Other", 403),
+        (b", ".join([b"X-Token"] * 3), 403),
+    ],
+)
+def test_preflight_request_headers_validation(requested_headers, status):
+    cors_app = CorsASGIApp(
+        app=app,
+        origins=["http://e.com"],
+        allow_headers=["X-Token"],
+        max_request_headers=2,
+    )
+    start, body, failures = cors_app.preflight_response(
+        b"http://e.com", b"GET", requested_headers
+    )
+    assert start["status"] == status
+    if status == 403:
+        assert body["body"] == b"Disallowed CORS headers"
+        assert failures == ("headers",)
+    else:
+        assert failures == ()
+
+
+def test_request_headers_validation_is_memoized():
+    cors_app = CorsASGIApp(
+        app=app, origins=["http://e.com"], allow_headers=["X-Token"],
+    )
+    policy = cors_app.policy
+    for _ in range(3):
+        assert cors_app.allowed_request_headers(b"X-Token", policy)
+    assert not cors_app.allowed_request_headers(b"X-Other", policy)
+    assert cors_app.request_headers_cache.info()["hits"] == 2
+    assert cors_app.request_headers_cache.info()["size"] == 2
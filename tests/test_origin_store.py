@@ -0,0 +1,159 @@
+import logging
+import mmap
+import os
+import pickle
+import struct
+
+import pytest
+
+from asgi_cors_middleware import CorsASGIApp, CorsPolicy
+from asgi_cors_middleware.origin_store import (
+    HEADER, MAGIC, MappedOriginStore, build_origin_store, main,
+    normalize_entry,
+)
+from .asgi_app import app
+from .clock import FakeClock
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "origins.cors")
+
+
+def test_lookup(store_path):
+    origins = ["https://tenant{}.e.com".format(i) for i in range(1000)]
+    assert build_origin_store(origins + ["HTTP://E.org/"], store_path) == 1001
+    store = MappedOriginStore(store_path)
+    assert len(store) == 1001
+    assert "https://tenant0.e.com" in store
+    assert "https://tenant999.e.com:443" in store
+    assert "http://e.org" in store
+    assert "https://tenant1000.e.com" not in store
+    assert "http://tenant0.e.com" not in store
+    assert "null" not in store
+    store.close()
+
+
+def test_empty_store(store_path):
+    build_origin_store([], store_path)
+    assert "https://e.com" not in MappedOriginStore(store_path)
+
+
+@pytest.mark.parametrize(
+    "entry", ["e.com", "https://*.e.com", "https://", "foo://e.com"],
+)
+def test_invalid_entries(entry):
+    with pytest.raises(ValueError):
+        normalize_entry(entry)
+
+
+def test_not_a_store(store_path):
+    with open(store_path, "wb") as f:
+        f.write(b"\0" * 64)
+    with pytest.raises(ValueError):
+        MappedOriginStore(store_path)
+
+
+def test_replaced_file_is_picked_up(store_path):
+    clock = FakeClock()
+    build_origin_store(["https://a.e.com"], store_path)
+    store = MappedOriginStore(store_path, check_interval=5, clock=clock)
+    build_origin_store(["https://b.e.com"], store_path)
+
+    # not checked again before check_interval
+    assert "https://a.e.com" in store
+    clock.now = 5
+    assert "https://b.e.com" in store
+    assert "https://a.e.com" not in store
+    assert store.reloads == 1
+
+
+def replace_file(path, content):
+    temporary = path + ".new"
+    with open(temporary, "wb") as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"garbage",
+        b"\0" * 64,
+        HEADER.pack(MAGIC, 1, 3) + b"\0" * 12,
+        HEADER.pack(MAGIC, 3, 4) + b"\0" * 16,
+        HEADER.pack(MAGIC, 1, 1024) + b"\0" * 16,
+        b"",
+        HEADER.pack(MAGIC, 1, 2) + struct.pack("<2I", 1, 1)
+        + b"\x0f\0https://z.e.com",
+    ],
+    ids=[
+        "short", "bad_magic", "table_size", "overfull", "truncated",
+        "empty", "no_empty_slot",
+    ],
+)
+def test_invalid_replacement_keeps_current_store(
+        store_path, content, caplog
+):
+    clock = FakeClock()
+    build_origin_store(["https://a.e.com"], store_path)
+    store = MappedOriginStore(store_path, check_interval=1, clock=clock)
+    replace_file(store_path, content)
+
+    with caplog.at_level(logging.ERROR):
+        for now in (1, 2, 3):
+            clock.now = now
+            assert "https://a.e.com" in store
+    assert len(caplog.records) == 1
+    assert store.reloads == 0
+
+    build_origin_store(["https://b.e.com"], store_path)
+    clock.now = 4
+    assert "https://b.e.com" in store
+    assert store.reloads == 1
+
+
+def test_out_of_bounds_record_offset(store_path):
+    table = struct.pack("<2I", 1000, 0)
+    replace_file(store_path, HEADER.pack(MAGIC, 1, 2) + table + b"\0\0")
+    store = MappedOriginStore(store_path)
+    assert "https://a.e.com" not in store
+    assert "https://b.e.com" not in store
+
+
+def test_lookups_never_probe_a_slot_twice(store_path):
+    build_origin_store(["https://a.e.com"], store_path)
+    store = MappedOriginStore(store_path)
+    full_table = HEADER.pack(MAGIC, 1, 2) + struct.pack("<2I", 1, 1) + \
+        b"\x0f\0https://z.e.com"
+    # bypass load()'s validation, as if the file changed under the map.
+    store.map = mmap.mmap(-1, len(full_table))
+    store.map.write(full_table)
+    assert "https://a.e.com" not in store
+
+
+def test_builder_command(tmp_path, store_path, capsys):
+    origins = tmp_path / "origins.txt"
+    origins.write_text("# tenants\nhttps://a.e.com\n\nhttps://b.e.com  # b\n")
+    main([str(origins), store_path])
+    assert capsys.readouterr().out.strip().endswith("2 origins")
+    assert not [name for name in os.listdir(tmp_path) if ".tmp" in name]
+    assert "https://b.e.com" in MappedOriginStore(store_path)
+
+
+@pytest.mark.asyncio
+async def test_policy_with_origin_store(store_path):
+    build_origin_store(["https://a.e.com"], store_path)
+    policy = CorsPolicy(
+        origins=["https://e.com"], origin_store=store_path,
+    )
+    assert policy.vary_origin
+    cors_app = CorsASGIApp(app=app, policy=policy, decision_cache_size=16)
+    assert cors_app.origin_decision(b"https://a.e.com")[0]
+    assert cors_app.origin_decision(b"https://e.com")[0]
+    assert not cors_app.origin_decision(b"https://b.e.com")[0]
+    # store lookups are never cached, a replaced file applies at once
+    assert len(cors_app.decision_cache) == 0
+
+    restored = pickle.loads(pickle.dumps(policy))
+    assert "https://a.e.com" in restored.origin_store
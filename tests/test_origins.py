@@ -0,0 +1,178 @@
+import pytest
+
+from asgi_cors_middleware.origins import (
+    OriginIndex, OriginRegexMatcher, literal_suffix, parse_origin,
+)
+
+
+@pytest.mark.parametrize(
+    "origin, expected",
+    [
+        ("http://e.com", ("http", "e.com", 80)),
+        ("HTTPS://E.com", ("https", "e.com", 443)),
+        ("http://e.com:8080", ("http", "e.com", 8080)),
+        ("http://[::1]:9000", ("http", "[::1]", 9000)),
+        ("capacitor://localhost", ("capacitor", "localhost", None)),
+        ("null", None),
+        ("http://e.com:abc", None),
+        ("e.com", None),
+    ],
+)
+def test_parse_origin(origin, expected):
+    assert parse_origin(origin) == expected
+
+
+class TestOriginIndex:
+    def test_exact_match(self):
+        index = OriginIndex(["http://e.com", "https://e.org:8443"])
+        assert "http://e.com" in index
+        assert "http://e.com:80" in index
+        assert "https://e.org:8443" in index
+        assert "https://e.com" not in index
+        assert "https://e.org" not in index
+        assert "http://e.com.evil.net" not in index
+        assert "http://sub.e.com" not in index
+
+    def test_entry_without_scheme(self):
+        index = OriginIndex(["www.example.com", "localhost:9000"])
+        assert "http://www.example.com" in index
+        assert "https://www.example.com" in index
+        assert "https://www.example.com:8443" not in index
+        assert "http://localhost:9000" in index
+        assert "http://localhost" not in index
+
+    def test_wildcard_entry_ignored(self):
+        index = OriginIndex(["*"])
+        assert len(index) == 0
+        assert index.allow_all
+
+    def test_schemes_without_default_port(self):
+        index = OriginIndex([
+            "capacitor://localhost", "chrome-extension://abcdefgh",
+            "app://*.e.com", "e.org", "*.e.net",
+        ])
+        assert "capacitor://localhost" in index
+        assert "chrome-extension://abcdefgh" in index
+        assert "app://a.e.com" in index
+        assert "capacitor://localhost:8080" not in index
+        assert "chrome-extension://other" not in index
+        # entries without a scheme stay on default ports.
+        assert "capacitor://e.org" not in index
+        assert "app://a.e.net" not in index
+
+    def test_null_origin(self):
+        index = OriginIndex(["null"])
+        assert index.allow_null
+        assert "null" in index
+        assert "http://null" not in index
+        assert "null" not in OriginIndex(["http://e.com"])
+
+    def test_entries_are_counted_across_updates(self):
+        index = OriginIndex(["http://e.com"])
+        index.update(["*", "e.org"])
+        assert index.entries == 3
+        assert index.allow_all
+        assert len(index) == 2
+
+    def test_invalid_entry(self):
+        with pytest.raises(ValueError):
+            OriginIndex(["http://"])
+
+    def test_substring_mode(self):
+        index = OriginIndex(["e.com"], substring=True)
+        assert "http://e.com.evil.net" in index
+        assert "http://e.org" not in index
+
+    def test_wildcard_subdomains(self):
+        index = OriginIndex(["https://*.e.com"])
+        assert "https://a.e.com" in index
+        assert "https://a.b.e.com" in index
+        assert "https://a.e.com:443" in index
+        assert "https://e.com" not in index
+        assert "http://a.e.com" not in index
+        assert "https://a.e.com:8443" not in index
+        assert "https://a.e.com.evil.net" not in index
+        assert "https://ae.com" not in index
+        assert len(index) == 1
+
+    def test_wildcard_scheme_and_port(self):
+        index = OriginIndex(
+            ["*.e.com", "http://*.dev.e.org:8080", "https://*.e.org"]
+        )
+        assert "http://a.e.com" in index
+        assert "https://a.e.com" in index
+        assert "https://a.e.com:8443" not in index
+        assert "http://a.dev.e.org:8080" in index
+        assert "http://a.dev.e.org" not in index
+        assert "https://a.dev.e.org" in index
+        assert "https://e.org" not in index
+
+    @pytest.mark.parametrize(
+        "entry", ["https://a.*.e.com", "https://*", "https://*..e.com"]
+    )
+    def test_invalid_wildcard_entry(self, entry):
+        with pytest.raises(ValueError):
+            OriginIndex([entry])
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        (r"https://.*\.example\.com", (".example.com", False)),
+        (r"https://e\.com$", ("https://e.com", True)),
+        (r"https://e\.(com|org)", ("", False)),
+        (r"(?i)https://.*\.example\.com", ("", False)),
+    ],
+)
+def test_literal_suffix(pattern, expected):
+    assert literal_suffix(pattern) == expected
+
+
+class TestOriginRegexMatcher:
+    def test_multiple_patterns(self):
+        matcher = OriginRegexMatcher(
+            [r"https://.*\.e\.com", r"https://[a-z]+\.e\.org", r"http://e\.net"]
+        )
+        assert matcher.literals == {"http://e.net"}
+        assert matcher.prefilter
+        assert matcher.fullmatch("https://a.e.com")
+        assert matcher.fullmatch("https://b.e.org")
+        assert matcher.fullmatch("http://e.net")
+        assert not matcher.fullmatch("https://1.e.org")
+        assert not matcher.fullmatch("https://a.e.com.evil.net")
+
+    def test_prefilter_rejects_without_regex(self):
+        matcher = OriginRegexMatcher(r"https://.*\.e\.com")
+        matcher.regex = None
+        assert not matcher.fullmatch("https://a.e.org")
+
+    def test_pattern_without_suffix_disables_prefilter(self):
+        matcher = OriginRegexMatcher([r"https://.*\.e\.com", r"http://e\..*"])
+        assert not matcher.prefilter
+        assert matcher.fullmatch("http://e.org")
+
+    def test_global_flags(self):
+        matcher = OriginRegexMatcher([r"(?i)https://E\.com", r"http://e\..*"])
+        assert matcher.fullmatch("https://e.com")
+        assert matcher.fullmatch("http://e.org")
+
+    def test_backreferences(self):
+        matcher = OriginRegexMatcher(
+            [r"https://(a)\1\.com", r"https://(b)x\1\.org", r"http://.*\.e\.net"]
+        )
+        assert len(matcher.standalone) == 2
+        assert matcher.fullmatch("https://aa.com")
+        assert matcher.fullmatch("https://bxb.org")
+        assert matcher.fullmatch("http://a.e.net")
+        assert not matcher.fullmatch("https://bxa.org")
+
+    def test_duplicate_named_groups(self):
+        matcher = OriginRegexMatcher(
+            [
+                r"https://(?P<sub>[a-z]+)\.e\.com",
+                r"https://(?P<sub>[a-z]+)\.e\.org",
+            ]
+        )
+        assert matcher.fullmatch("https://a.e.com")
+        assert matcher.fullmatch("https://b.e.org")
+        assert not matcher.fullmatch("https://1.e.org")
@@ -0,0 +1,268 @@
+import asyncio
+import gc
+import json
+import os
+import pickle
+import time
+import types
+
+import pytest
+
+from asgi_cors_middleware import CorsASGIApp, CorsPolicy
+from asgi_cors_middleware.policy import PolicyFileWatcher, freeze_for_fork
+from .asgi_app import app
+
+
+def write_policy(path, options, mtime):
+    path.write_text(json.dumps(options))
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_policy_is_immutable():
+    policy = CorsPolicy(origins=["http://e.com"])
+    with pytest.raises(AttributeError):
+        policy.max_age = 10
+    with pytest.raises(AttributeError):
+        policy.extra = True
+    with pytest.raises(TypeError):
+        policy.origin_index.update(["http://e.org"])
+
+
+def assert_frozen_trie(node):
+    assert isinstance(node, types.MappingProxyType)
+    for label, child in node.items():
+        if label:
+            assert_frozen_trie(child)
+        else:
+            assert isinstance(child, frozenset)
+
+
+def test_policy_is_made_of_immutable_values():
+    policy = CorsPolicy(
+        origins=["http://e.com", "e.org", "https://*.e.net", "*.a.e.net"],
+        allow_methods=["GET", "POST"],
+        allow_headers=["X-Token"],
+        expose_headers=["X-Exposed"],
+        allow_origin_regex=r"https://.*\.e\.net",
+    )
+    assert not hasattr(policy, "__dict__")
+    assert isinstance(policy.allow_methods, frozenset)
+    assert isinstance(policy.allow_headers, frozenset)
+    assert isinstance(policy.origin_index.exact, types.MappingProxyType)
+    assert isinstance(policy.origin_index.any_scheme, types.MappingProxyType)
+    assert policy.origin_index.wildcards
+    assert_frozen_trie(policy.origin_index.wildcards)
+    for raw_headers in (
+        policy.simple_raw_headers, policy.preflight_raw_headers,
+    ):
+        assert isinstance(raw_headers, tuple)
+        assert all(
+            isinstance(key, bytes) and isinstance(value, bytes)
+            for key, value in raw_headers
+        )
+
+
+def test_policy_pickle_round_trip():
+    policy = CorsPolicy(
+        origins=["http://e.com", "https://*.e.org"],
+        allow_origin_regex=r"https://.*\.e\.net",
+        max_age=60,
+    )
+    restored = pickle.loads(pickle.dumps(policy))
+    assert "http://e.com" in restored.origin_index
+    assert "https://a.e.org" in restored.origin_index
+    assert_frozen_trie(restored.origin_index.wildcards)
+    assert restored.allow_origin_regex.fullmatch("https://a.e.net")
+    assert restored.preflight_raw_headers == policy.preflight_raw_headers
+    with pytest.raises(AttributeError):
+        restored.max_age = 10
+
+
+def test_freeze_for_fork():
+    CorsPolicy(origins=["http://e.com"])
+    try:
+        freeze_for_fork()
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+
+
+def test_policy_from_file(tmp_path):
+    path = tmp_path / "cors.json"
+    write_policy(path, {"origins": ["http://e.com"], "max_age": 60}, 1)
+    policy = CorsPolicy.from_file(str(path))
+    assert "http://e.com" in policy.origin_index
+    assert (b"access-control-max-age", b"60") in policy.preflight_raw_headers
+
+
+def test_policy_from_file_requires_object(tmp_path):
+    path = tmp_path / "cors.json"
+    write_policy(path, ["http://e.com"], 1)
+    with pytest.raises(ValueError):
+        CorsPolicy.from_file(str(path))
+
+
+@pytest.mark.asyncio
+async def test_build_async_yields_between_chunks():
+    origins = ["http://e{}.com".format(i) for i in range(10)]
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0)
+
+    task = asyncio.ensure_future(ticker())
+    try:
+        policy = await CorsPolicy.build_async(
+            {"origins": origins, "max_age": 5}, chunk_size=2
+        )
+    finally:
+        task.cancel()
+    assert len(ticks) >= 4
+    assert all(origin in policy.origin_index for origin in origins)
+    assert (b"access-control-max-age", b"5") in policy.preflight_raw_headers
+
+
+@pytest.mark.asyncio
+async def test_build_async_never_holds_the_loop_for_long():
+    origins = [
+        "https://h{}.e.com".format(i) if i % 2 else
+        "https://*.w{}.e.org".format(i)
+        for i in range(200000)
+    ]
+    origins.append("*")
+    max_age_by_origin = {
+        "https://t{}.e.com".format(i): 60 + i % 3 for i in range(50000)
+    }
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0)
+
+    # a full collection triggered by the new keys would stall the loop
+    #  whatever the build does.
+    gc.disable()
+    task = asyncio.ensure_future(ticker())
+    try:
+        await asyncio.sleep(0)
+        policy = await CorsPolicy.build_async(
+            {
+                "origins": (origin for origin in origins),
+                "max_age_by_origin": max_age_by_origin,
+            },
+            chunk_size=1000,
+        )
+        ticks.append(time.perf_counter())
+    finally:
+        task.cancel()
+        gc.enable()
+
+    # 251 chunks: no step may take a sizeable share of the whole build. The
+    #  largest gaps left are the resizes of the index's tables, the final
+    #  build after the last chunk takes no longer than a chunk.
+    gaps = [after - before for before, after in zip(ticks, ticks[1:])]
+    assert max(gaps) < (ticks[-1] - ticks[0]) / 10
+    assert gaps[-1] < 3 * sorted(gaps)[len(gaps) // 2]
+    assert policy.allow_all_origins
+    assert len(policy.origin_index) == 200000
+    assert "https://h199999.e.com" in policy.origin_index
+    assert "https://a.w199998.e.org" in policy.origin_index
+    assert dict(policy.origin_preflight_headers("https://t4.e.com"))[
+        b"access-control-max-age"
+    ] == b"61"
+
+
+@pytest.mark.asyncio
+class TestPolicyReload:
+    async def test_swap_policy_clears_caches(self):
+        cors_app = CorsASGIApp(
+            app=app, origins=["http://e.com"], decision_cache_size=8
+        )
+        assert cors_app.origin_decision(b"http://e.org")[0] is False
+        cors_app.swap_policy(CorsPolicy(origins=["http://e.org"]))
+        assert len(cors_app.decision_cache) == 0
+        assert cors_app.origin_decision(b"http://e.org")[0] is True
+
+    async def test_file_changes_are_picked_up(self, tmp_path):
+        path = tmp_path / "cors.json"
+        write_policy(path, {"origins": ["http://e.com"]}, 1)
+        cors_app = CorsASGIApp(app=app, policy_file=str(path))
+        watcher = cors_app.policy_watcher
+        assert cors_app.is_allowed_origin("http://e.com")
+
+        assert not await watcher.check()
+
+        write_policy(path, {"origins": ["http://e.org"]}, 2)
+        assert await watcher.check()
+        assert cors_app.is_allowed_origin("http://e.org")
+        assert not cors_app.is_allowed_origin("http://e.com")
+
+    async def test_invalid_file_keeps_policy(self, tmp_path):
+        path = tmp_path / "cors.json"
+        write_policy(path, {"origins": ["http://e.com"]}, 1)
+        cors_app = CorsASGIApp(app=app, policy_file=str(path))
+        policy = cors_app.policy
+
+        path.write_text("{not json")
+        os.utime(path, ns=(2, 2))
+        assert not await cors_app.policy_watcher.check()
+        assert cors_app.policy is policy
+
+    async def test_watcher_started_on_lifespan(self, tmp_path):
+        path = tmp_path / "cors.json"
+        write_policy(path, {"origins": ["http://e.com"]}, 1)
+
+        async def lifespan_app(scope, receive, send):
+            pass
+
+        cors_app = CorsASGIApp(app=lifespan_app, policy_file=str(path))
+        await cors_app({"type": "lifespan"}, None, None)
+        watcher = cors_app.policy_watcher
+        assert isinstance(watcher, PolicyFileWatcher)
+        assert watcher.task is not None
+        await watcher.stop()
+        assert watcher.task is None
+
+
+def test_max_age_by_origin():
+    policy = CorsPolicy(
+        origins=["https://app.e.com", "https://*.tenant.e.com"],
+        max_age=600,
+        max_age_by_origin={
+            "https://app.e.com": 7200,
+            "https://*.tenant.e.com": 60,
+            "https://unused.e.com": 600,
+        },
+    )
+    assert len(policy.max_age_tiers) == 2
+
+    def max_age(origin):
+        return dict(policy.origin_preflight_headers(origin))[
+            b"access-control-max-age"
+        ]
+
+    assert max_age("https://app.e.com") == b"7200"
+    assert max_age("https://a.tenant.e.com") == b"60"
+    assert max_age("https://other.e.com") == b"600"
+    restored = pickle.loads(pickle.dumps(policy))
+    assert restored.origin_preflight_headers("https://app.e.com") == \
+        policy.origin_preflight_headers("https://app.e.com")
+
+
+@pytest.mark.asyncio
+async def test_preflight_uses_origin_max_age():
+    cors_app = CorsASGIApp(
+        app=app,
+        origins=["*"],
+        max_age_by_origin={"https://app.e.com": 7200},
+    )
+    for origin, expected in (
+        (b"https://app.e.com", b"7200"), (b"https://e.org", b"600"),
+    ):
+        start, _, _ = cors_app.preflight_response(origin, b"GET")
+        headers = dict(start["headers"])
+        assert headers[b"access-control-max-age"] == expected
+        assert headers[b"vary"] == b"Origin"
@@ -0,0 +1,90 @@
+import pytest
+
+from asgi_cors_middleware import CorsASGIApp
+from asgi_cors_middleware.profiling import AllocationProfiler
+from .asgi_app import app
+
+ORIGIN = (b"origin", b"http://e.com")
+REQUESTS = {
+    "passthrough": ("GET", []),
+    "simple": ("GET", [ORIGIN]),
+    "preflight": ("OPTIONS", [
+        ORIGIN,
+        (b"access-control-request-method", b"GET"),
+        (b"access-control-request-headers", b"x-token"),
+    ]),
+}
+
+
+async def receive():
+    return {"type": "http.request"}
+
+
+async def send(message):
+    pass
+
+
+async def request(cors_app, request_type):
+    method, headers = REQUESTS[request_type]
+    await cors_app(
+        {"type": "http", "method": method, "path": "/", "headers": headers},
+        receive, send,
+    )
+
+
+@pytest.fixture
+def profiler():
+    profiler = AllocationProfiler()
+    yield profiler
+    profiler.stop()
+
+
+@pytest.mark.asyncio
+async def test_allocations_by_code_path(profiler):
+    cors_app = CorsASGIApp(
+        app=app,
+        origins=["http://e.com", "http://e.org"],
+        allow_headers=["X-Token"],
+        decision_cache_size=16,
+        preflight_cache_size=16,
+        allocation_profiler=profiler,
+    )
+    # fill the caches before measuring
+    for request_type in REQUESTS:
+        await request(cors_app, request_type)
+    profiler.reset()
+    for _ in range(2):
+        for request_type in REQUESTS:
+            await request(cors_app, request_type)
+
+    report = profiler.report()
+    assert {
+        request_type: entry["requests"]
+        for request_type, entry in report.items()
+    } == {"passthrough": 2, "simple": 2, "preflight": 2}
+    assert set(report["simple"]["live"]) <= {
+        "__call__", "simple_response", "send"
+    }
+    assert "send" in report["simple"]["live"]
+    assert "preflight_response" in report["preflight"]["live"]
+    assert "simple_response" not in report["preflight"]["live"]
+
+    # nothing outlives a request once the caches are warm
+    for request_type in REQUESTS:
+        assert profiler.bytes_per_request(request_type, "retained") == 0
+    # allocation budgets, well above what the middleware needs today
+    assert profiler.bytes_per_request("passthrough") < 1024
+    assert profiler.bytes_per_request("simple", path="send") < 1024
+    assert profiler.bytes_per_request("preflight") < 4096
+
+
+@pytest.mark.asyncio
+async def test_profiler_counts_cache_growth(profiler):
+    cors_app = CorsASGIApp(
+        app=app,
+        origins=["http://e.com", "http://e.org"],
+        decision_cache_size=16,
+        allocation_profiler=profiler,
+    )
+    await request(cors_app, "simple")
+    assert profiler.bytes_per_request("simple", "retained") > 0
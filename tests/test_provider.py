@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from asgi_cors_middleware import CorsASGIApp
+from asgi_cors_middleware.provider import CachedOriginProvider
+from .asgi_app import app
+from .clock import FakeClock
+from .test_middleware import (
+    ALLOW_METHODS, ALLOW_ORIGIN, MAX_AGE, REQUEST_METHOD, do_cors_response,
+)
+
+
+class TenantProvider:
+    """In-process stand-in for a tenant database."""
+
+    def __init__(self, origins, delay=0):
+        self.origins = set(origins)
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, origin):
+        self.calls.append(origin)
+        await asyncio.sleep(self.delay)
+        return origin in self.origins
+
+
+@pytest.mark.asyncio
+class TestCachedOriginProvider:
+    async def test_concurrent_lookups_share_one_call(self):
+        backend = TenantProvider(["https://t.e.com"], delay=0.01)
+        provider = CachedOriginProvider(backend)
+        results = await asyncio.gather(
+            *[provider("https://t.e.com") for _ in range(50)]
+        )
+        assert all(results)
+        assert backend.calls == ["https://t.e.com"]
+        assert provider.inflight == {}
+
+    async def test_ttl(self):
+        clock = FakeClock()
+        backend = TenantProvider(["https://t.e.com"])
+        provider = CachedOriginProvider(
+            backend, ttl=10, negative_ttl=1, clock=clock
+        )
+        assert await provider("https://t.e.com")
+        assert not await provider("https://x.e.com")
+        clock.now = 0.5
+        assert await provider("https://t.e.com")
+        assert not await provider("https://x.e.com")
+        assert len(backend.calls) == 2
+
+        clock.now = 2
+        backend.origins.add("https://x.e.com")
+        assert await provider("https://x.e.com")
+        assert await provider("https://t.e.com")
+        assert len(backend.calls) == 3
+
+        clock.now = 20
+        backend.origins.clear()
+        assert not await provider("https://t.e.com")
+        assert len(backend.calls) == 4
+
+    async def test_failing_provider_denies_without_caching(self):
+        calls = []
+
+        async def failing(origin):
+            calls.append(origin)
+            raise RuntimeError("database unavailable")
+
+        provider = CachedOriginProvider(failing)
+        assert not await provider("https://t.e.com")
+        assert not await provider("https://t.e.com")
+        assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+class TestMiddlewareOriginProvider:
+    async def test_preflight_allowed_by_provider(self):
+        backend = TenantProvider(["https://t.e.com"])
+        cors_app = CorsASGIApp(
+            app=app,
+            origins=["https://e.com"],
+            origin_provider=backend,
+            preflight_cache_size=8,
+        )
+        for _ in range(2):
+            await do_cors_response(
+                scope={
+                    "method": "OPTIONS",
+                    "headers": [
+                        (b"origin", b"https://t.e.com"),
+                        (REQUEST_METHOD, b"GET"),
+                    ],
+                },
+                expected_output={
+                    "status": 204,
+                    "headers": [
+                        (ALLOW_ORIGIN, b"https://t.e.com"),
+                        (ALLOW_METHODS, b"GET"),
+                        (MAX_AGE, b"600"),
+                        (b"vary", b"Origin"),
+                    ],
+                    "body": b"",
+                },
+                cors_app=cors_app,
+            )
+        assert backend.calls == ["https://t.e.com"]
+        assert len(cors_app.preflight_cache) == 0
+
+    async def test_static_origin_skips_provider(self):
+        backend = TenantProvider([])
+        await do_cors_response(
+            scope={"method": "GET", "headers": [(b"origin", b"https://e.com")]},
+            expected_output={
+                "status": 200,
+                "headers": [
+                    (ALLOW_ORIGIN, b"https://e.com"),
+                    (b"vary", b"Origin"),
+                    (b"content-length", b"17"),
+                    (b"content-type", b"application/json"),
+                ],
+                "body": b'{"hello":"world"}',
+            },
+            cors_options={
+                "origins": ["https://e.com"], "origin_provider": backend,
+            },
+        )
+        assert backend.calls == []
+
+    async def test_simple_denied_by_provider(self):
+        backend = TenantProvider([])
+        await do_cors_response(
+            scope={"method": "GET", "headers": [(b"origin", b"https://x.com")]},
+            expected_output={
+                "status": 200,
+                "headers": [
+                    (b"content-length", b"17"),
+                    (b"content-type", b"application/json"),
+                ],
+                "body": b'{"hello":"world"}',
+            },
+            cors_options={
+                "origins": ["https://e.com"], "origin_provider": backend,
+            },
+        )
+        assert backend.calls == ["https://x.com"]
@@ -0,0 +1,103 @@
+import pytest
+
+from asgi_cors_middleware import CorsASGIApp, CorsPolicy
+from asgi_cors_middleware.routing import PolicyRouter
+from .asgi_app import app
+from .test_middleware import (
+    ALLOW_METHODS, ALLOW_ORIGIN, MAX_AGE, REQUEST_METHOD, do_cors_response,
+)
+
+PUBLIC = CorsPolicy(origins=["*"])
+ADMIN = CorsPolicy(origins=["https://admin.e.com"], max_age=60)
+DEFAULT = CorsPolicy(origins=["https://e.com"])
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/", DEFAULT),
+        ("/api", PUBLIC),
+        ("/api/", PUBLIC),
+        ("/api/users/1", PUBLIC),
+        ("/apix", DEFAULT),
+        ("/api/admin/users", ADMIN),
+        ("/health", None),
+        ("/health/live", None),
+    ],
+)
+def test_router_lookup(path, expected):
+    router = PolicyRouter({
+        "/api": PUBLIC,
+        "/api/admin/": ADMIN,
+        "/health": None,
+    })
+    assert router.lookup(path, DEFAULT) is expected
+
+
+def test_router_root_prefix():
+    router = PolicyRouter({"/": ADMIN, "/api": PUBLIC})
+    assert router.lookup("/static/app.js", DEFAULT) is ADMIN
+    assert router.lookup("/api", DEFAULT) is PUBLIC
+
+
+@pytest.mark.asyncio
+class TestRoutes:
+    def cors_app(self):
+        return CorsASGIApp(
+            app=app,
+            origins=["https://e.com"],
+            routes={"/admin": ADMIN, "/health": None},
+            decision_cache_size=8,
+            preflight_cache_size=8,
+        )
+
+    async def test_preflight_uses_route_policy(self):
+        cors_app = self.cors_app()
+        preflight = [
+            (b"origin", b"https://admin.e.com"), (REQUEST_METHOD, b"GET"),
+        ]
+        await do_cors_response(
+            scope={"method": "OPTIONS", "path": "/admin/users",
+                   "headers": preflight},
+            expected_output={
+                "status": 204,
+                "headers": [
+                    (ALLOW_ORIGIN, b"https://admin.e.com"),
+                    (ALLOW_METHODS, b"GET"),
+                    (MAX_AGE, b"60"),
+                ],
+                "body": b"",
+            },
+            cors_app=cors_app,
+        )
+        await do_cors_response(
+            scope={"method": "OPTIONS", "path": "/", "headers": preflight},
+            expected_output={
+                "status": 403,
+                "headers": [
+                    (ALLOW_METHODS, b"GET"),
+                    (MAX_AGE, b"600"),
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", b"22"),
+                ],
+                "body": b"Disallowed CORS origin",
+            },
+            cors_app=cors_app,
+        )
+
+    async def test_excluded_path_passes_through(self):
+        await do_cors_response(
+            scope={
+                "method": "OPTIONS",
+                "path": "/health",
+                "headers": [
+                    (b"origin", b"https://e.com"), (REQUEST_METHOD, b"GET"),
+                ],
+            },
+            expected_output={
+                "status": 500,
+                "headers": [(b"content-type", b"text/plain")],
+                "body": b"Internal Server Error",
+            },
+            cors_app=self.cors_app(),
+        )
@@ -0,0 +1,115 @@
+import pytest
+
+from asgi_cors_middleware import CorsASGIApp, CorsMetrics
+from asgi_cors_middleware.throttle import THROTTLED_BODY, PreflightThrottle
+from .asgi_app import app
+from .clock import FakeClock
+from .test_middleware import REQUEST_METHOD
+
+
+def test_bucket_refills():
+    clock = FakeClock()
+    throttle = PreflightThrottle(rate=0.5, burst=2, clock=clock)
+    throttle.charge(b"http://evil.net")
+    assert not throttle.blocked(b"http://evil.net")
+    throttle.charge(b"http://evil.net")
+    assert throttle.blocked(b"http://evil.net")
+    assert not throttle.blocked(b"http://other.net")
+    clock.now = 2.0
+    assert not throttle.blocked(b"http://evil.net")
+
+
+def test_bounded_table_and_stale_eviction():
+    clock = FakeClock()
+    throttle = PreflightThrottle(rate=1, burst=2, maxsize=2, clock=clock)
+    for origin in (b"http://a.net", b"http://b.net", b"http://c.net"):
+        throttle.charge(origin)
+    assert list(throttle.buckets) == [b"http://b.net", b"http://c.net"]
+    assert throttle.evictions == 1
+
+    # b.net and c.net have refilled once 2 seconds have passed
+    clock.now = 2.0
+    throttle.charge(b"http://d.net")
+    assert list(throttle.buckets) == [b"http://d.net"]
+    assert throttle.evictions == 1
+
+
+@pytest.mark.parametrize("status", [429, 403])
+def test_pre_rendered_response(status):
+    throttle = PreflightThrottle(rate=0.25, status=status)
+    headers = dict(throttle.headers)
+    assert headers[b"content-length"] == str(len(THROTTLED_BODY)).encode()
+    assert (b"retry-after" in headers) is (status == 429)
+    if status == 429:
+        assert headers[b"retry-after"] == b"4"
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        PreflightThrottle(status=404)
+    with pytest.raises(ValueError):
+        PreflightThrottle(rate=0)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("with_metrics", [False, True])
+async def test_rejected_preflights_are_throttled(with_metrics):
+    throttle = PreflightThrottle(rate=0.001, burst=2, clock=FakeClock())
+    metrics = CorsMetrics(clock=FakeClock(step=0.0001)) if with_metrics else None
+    cors_app = CorsASGIApp(
+        app=app, origins=["http://e.com"], preflight_throttle=throttle,
+        metrics=metrics,
+    )
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    for origin in [b"http://evil.net"] * 4 + [b"http://e.com"]:
+        await cors_app(
+            {"type": "http", "method": "OPTIONS", "path": "/", "headers": [
+                (b"origin", origin), (REQUEST_METHOD, b"GET"),
+            ]},
+            receive, send,
+        )
+
+    assert statuses == [403, 403, 429, 429, 204]
+    assert throttle.throttled == 2
+    if with_metrics:
+        assert metrics.requests["preflight_throttled"] == 2
+        assert metrics.requests["preflight_403"] == 2
+
+    cors_app.swap_policy(cors_app.policy)
+    assert len(throttle) == 0
+
+
+@pytest.mark.asyncio
+async def test_allowed_origins_are_never_charged():
+    throttle = PreflightThrottle(rate=0.001, burst=2, clock=FakeClock())
+    cors_app = CorsASGIApp(
+        app=app, origins=["https://good.com"], preflight_throttle=throttle,
+    )
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    for method in [b"DELETE"] * 10 + [b"GET"]:
+        await cors_app(
+            {"type": "http", "method": "OPTIONS", "path": "/", "headers": [
+                (b"origin", b"https://good.com"), (REQUEST_METHOD, method),
+            ]},
+            receive, send,
+        )
+
+    assert statuses == [403] * 10 + [204]
+    assert len(throttle) == 0
+    assert throttle.throttled == 0